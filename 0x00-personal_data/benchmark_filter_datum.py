@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Microbenchmark comparing the per-field and single-pass filter_datum."""
+
+import re
+import timeit
+from typing import List
+
+from filtered_logger import filter_datum
+
+FIELD_NAMES = ["name", "email", "ssn", "password", "phone",
+               "ip", "last_login", "user_agent"]
+
+
+def filter_datum_per_field(fields: List[str], redaction: str,
+                           message: str, separator: str) -> str:
+    """Reference implementation running one re.sub per field."""
+    for field in fields:
+        message = re.sub(f"{field}=(.*?){separator}",
+                         f"{field}={redaction}{separator}", message)
+    return message
+
+
+def build_message(fields: List[str], repeat: int) -> str:
+    """Builds a log line holding every field `repeat` times."""
+    pairs = "".join(f"{field}=value_{i};"
+                    for i in range(repeat) for field in FIELD_NAMES)
+    return pairs + "".join(f"{field}=x;" for field in fields)
+
+
+def main():
+    """Times both implementations across message sizes and field counts."""
+    number = 2000
+    print(f"{'fields':>6} {'bytes':>7} {'per-field':>10} "
+          f"{'single':>10} {'speedup':>8}")
+    for n_fields in (1, 3, 5, 8):
+        fields = FIELD_NAMES[:n_fields]
+        for repeat in (1, 10, 100):
+            message = build_message(fields, repeat)
+            expected = filter_datum_per_field(fields, "***", message, ";")
+            assert filter_datum(fields, "***", message, ";") == expected
+            old = timeit.timeit(
+                lambda: filter_datum_per_field(fields, "***", message, ";"),
+                number=number)
+            new = timeit.timeit(
+                lambda: filter_datum(fields, "***", message, ";"),
+                number=number)
+            print(f"{n_fields:>6} {len(message):>7} "
+                  f"{old / number * 1e6:>8.1f}us "
+                  f"{new / number * 1e6:>8.1f}us {old / new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
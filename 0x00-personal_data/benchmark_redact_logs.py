@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Benchmark of redact_logs throughput against the number of workers."""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from filtered_logger import PII_FIELDS, RedactingFormatter
+from redact_logs import DEFAULT_CHUNK_SIZE, redact_file
+
+LINE = ("[HOLBERTON] user_data INFO 2019-11-19 18:37:59,596: "
+        "name=Marlene Wood; email=hwestiii@att.net; phone=(473) 401-4253; "
+        "ssn=261-72-6780; password=K5?BMNv; ip=60ed:c396:2ff:244:bbd0; "
+        "last_login=2019-11-14 06:14:24; user_agent=Mozilla/5.0;\n")
+
+
+def main():
+    """Redacts a synthetic ~256 MiB log with 1, 2, 4... workers."""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "user_data.log")
+        with open(source, "w") as f:
+            block = LINE * 10000
+            for _ in range((256 << 20) // len(block)):
+                f.write(block)
+        size = os.path.getsize(source)
+
+        baseline = None
+        workers = 1
+        while workers <= os.cpu_count():
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                start = time.perf_counter()
+                redact_file(executor, source, source + ".redacted",
+                            PII_FIELDS, RedactingFormatter.REDACTION,
+                            RedactingFormatter.SEPARATOR,
+                            DEFAULT_CHUNK_SIZE, 2 * workers)
+                elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{workers:>3} workers: {size / elapsed / 2**20:8.1f} MiB/s"
+                  f"  speedup {baseline / elapsed:5.2f}x")
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
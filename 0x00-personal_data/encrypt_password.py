@@ -1,20 +1,19 @@
 #!/usr/bin/env python3
 """Module that provides a function to hash passwords securely using bcrypt."""
 
-import bcrypt
+from password_hasher import default_hasher
 
 
 def hash_password(password: str) -> bytes:
     """Hash a password for storing.
 
+    The hash runs on the shared PasswordHasher pool with its calibrated
+    cost factor.
+
     :param password: The password to hash.
     :return: A salted, hashed password as a byte string.
     """
-    # Generate a salt
-    salt = bcrypt.gensalt()
-    # Create a hashed password
-    hashed_password = bcrypt.hashpw(password.encode(), salt)
-    return hashed_password
+    return default_hasher().hash(password)
 
 
 def is_valid(hashed_password: bytes, password: str) -> bool:
@@ -25,4 +24,4 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     :return: True if the password matches the hashed password, otherwise
         False.
     """
-    return bcrypt.checkpw(password.encode(), hashed_password)
+    return default_hasher().verify(hashed_password, password)
@@ -1,23 +1,44 @@
 #!/usr/bin/env python3
 """Module for filtering sensitive data from log messages."""
 
+import argparse
+import atexit
+import copy
+import io
 import logging
+import logging.handlers
+import queue
+import sys
+import time
+from functools import lru_cache
 from os import environ
 import mysql.connector
 import re
-from typing import List
+from typing import List, Pattern, TextIO, Tuple
 
 # Define the fields considered as PII data
 PII_FIELDS = ("name", "email", "ssn", "password", "phone")
 
 
+@lru_cache(maxsize=128)
+def _redaction_pattern(fields: Tuple[str, ...], separator: str) -> Pattern:
+    """Compiles one alternation pattern matching every field at once.
+
+    The pattern is cached per (fields, separator) pair so repeated calls
+    with the same configuration never rebuild or recompile it.
+    """
+    alternation = "|".join(f"(?:{field})" for field in fields)
+    return re.compile(f"({alternation})=.*?{separator}")
+
+
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
     """Obfuscates specified fields in a log message using a single regex."""
-    for field in fields:
-        message = re.sub(f"{field}=(.*?){separator}",
-                         f"{field}={redaction}{separator}", message)
-    return message
+    if not fields:
+        return message
+    pattern = _redaction_pattern(tuple(fields), separator)
+    replacement = f"={redaction}{separator}"
+    return pattern.sub(lambda match: match.group(1) + replacement, message)
 
 
 class RedactingFormatter(logging.Formatter):
@@ -42,8 +63,75 @@ class RedactingFormatter(logging.Formatter):
         return super(RedactingFormatter, self).format(record)
 
 
-def get_logger() -> logging.Logger:
-    """Creates and returns a logger with a specific configuration."""
+class OverflowQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for a bounded queue with an overflow policy.
+
+    The calling thread only snapshots the record and enqueues it;
+    redaction and I/O happen on the QueueListener thread. When the queue
+    is full the policy decides what happens:
+
+    - "block": wait for room in the queue.
+    - "drop": discard the record.
+    - "sample": wait for room for one record out of every sample_rate,
+      discard the others.
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop", "sample")
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = "block",
+                 sample_rate: int = 10):
+        """Initializes an OverflowQueueHandler object."""
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        super(OverflowQueueHandler, self).__init__(log_queue)
+        self.overflow = overflow
+        self.sample_rate = max(1, sample_rate)
+        self.dropped = 0
+        self._overflowed = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Snapshots the record without formatting or redacting it."""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        """Enqueues a record, applying the overflow policy when full."""
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._overflowed += 1
+            if self.overflow == "sample" and \
+                    self._overflowed % self.sample_rate == 0:
+                self.queue.put(record)
+            else:
+                self.dropped += 1
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop always drains the queue first."""
+
+    def enqueue_sentinel(self):
+        """Waits for room so the sentinel is never lost on a full queue."""
+        self.queue.put(self._sentinel)
+
+
+def get_logger(queued: bool = False, max_queue_size: int = 10000,
+               overflow: str = "block") -> logging.Logger:
+    """Creates and returns a logger with a specific configuration.
+
+    With queued=True records go through a bounded queue to a background
+    listener thread that redacts and writes them; the listener is stopped,
+    and the queue flushed, at interpreter exit.
+    """
     # Create a logger object
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)
@@ -53,7 +141,19 @@ def get_logger() -> logging.Logger:
     stream_handler = logging.StreamHandler()
     formatter = RedactingFormatter(list(PII_FIELDS))
     stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
+
+    if not queued:
+        logger.addHandler(stream_handler)
+        return logger
+
+    log_queue = queue.Queue(maxsize=max_queue_size)
+    queue_handler = OverflowQueueHandler(log_queue, overflow)
+    listener = FlushingQueueListener(log_queue, stream_handler,
+                                     respect_handler_level=True)
+    queue_handler.listener = listener
+    listener.start()
+    atexit.register(listener.stop)
+    logger.addHandler(queue_handler)
 
     return logger
 
@@ -79,11 +179,64 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     return cnctn
 
 
+def export_rows(cursor, sink: TextIO, batch_size: int) -> int:
+    """Stream every row of an executed cursor to sink in redacted batches.
+
+    Rows are pulled with fetchmany so only one batch is held in memory,
+    each batch is redacted with a single filter_datum call and written
+    to sink as one block. Returns the number of rows exported.
+    """
+    headers = [column[0] for column in cursor.description]
+    formatter = RedactingFormatter(list(PII_FIELDS))
+    exported = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        # One record per batch: the prefix shares the batch timestamp
+        prefix = formatter.format(logging.makeLogRecord(
+            {"name": "user_data", "levelname": "INFO", "msg": ""}))
+        lines = "\n".join(
+            prefix + "".join(f"{header}={value}; "
+                             for header, value in zip(headers, row)).strip()
+            for row in rows)
+        sink.write(filter_datum(formatter.fields, formatter.REDACTION,
+                                lines, formatter.SEPARATOR) + "\n")
+        exported += len(rows)
+    return exported
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse the command line options of main."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="stream rows in batches of this size instead "
+                             "of logging them one by one")
+    return parser.parse_args(argv)
+
+
 def main():
     """Fetch a db connection from get_db and select
     all rows in the users table
     and display each row under a filtered format."""
+    args = parse_args()
     db = get_db()
+    if args.batch_size is not None and args.batch_size > 0:
+        # Unbuffered cursor: rows stay on the server until fetched
+        cursor = db.cursor(buffered=False)
+        cursor.execute("SELECT * FROM users")
+        sink = io.open(sys.stderr.fileno(), "w", buffering=1 << 20,
+                       closefd=False)
+        start = time.perf_counter()
+        exported = export_rows(cursor, sink, args.batch_size)
+        sink.flush()
+        elapsed = time.perf_counter() - start
+        print(f"exported {exported} rows in {elapsed:.2f}s "
+              f"({exported / max(elapsed, 1e-9):.0f} rows/s)")
+        cursor.close()
+        db.close()
+        return
+
     cursor = db.cursor()
     cursor.execute("SELECT * FROM users")
     csv_headers = [i[0] for i in cursor.description]
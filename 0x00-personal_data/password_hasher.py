@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+""" This module defines a bcrypt hashing service backed by a thread pool
+    with a startup calibrated cost factor and rehash-on-login support
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import bcrypt
+
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+CALIBRATION_ROUNDS = 8
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """ This function returns the cost factor stored in a bcrypt hash
+    """
+    return int(hashed_password.split(b"$")[2])
+
+
+def calibrate_rounds(target_ms: float, min_rounds: int = MIN_ROUNDS,
+                     max_rounds: int = MAX_ROUNDS) -> int:
+    """ This function returns the highest cost factor whose hash time
+    stays under target_ms on this machine, clamped to the given bounds
+    """
+    salt = bcrypt.gensalt(CALIBRATION_ROUNDS)
+    elapsed = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        elapsed = min(elapsed, (time.perf_counter() - start) * 1000)
+    # Each extra round doubles the work
+    extra = math.floor(math.log2(target_ms / max(elapsed, 1e-3)))
+    return max(min_rounds, min(max_rounds, CALIBRATION_ROUNDS + extra))
+
+
+class PasswordHasher:
+    """ PasswordHasher class running bcrypt on a pool of threads
+    """
+
+    def __init__(self, rounds: int = None, target_ms: float = 250,
+                 max_workers: int = None, samples: int = 1024):
+        """ Initialize a new PasswordHasher instance, calibrating the cost
+        factor against target_ms when rounds is not given
+        """
+        if rounds is None:
+            rounds = calibrate_rounds(target_ms)
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._completed = 0
+        self._total_ms = 0.0
+        self._latencies = deque(maxlen=samples)
+
+    def _run(self, func, *args):
+        """ This method runs func in a worker and records its latency """
+        with self._lock:
+            self._queued -= 1
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._completed += 1
+                self._total_ms += elapsed
+                self._latencies.append(elapsed)
+
+    def _submit(self, func, *args) -> Future:
+        """ This method queues func on the pool and returns its future """
+        with self._lock:
+            self._queued += 1
+        return self._executor.submit(self._run, func, *args)
+
+    def hash_async(self, password: str) -> Future:
+        """ This method returns a future of the salted hash of password
+        """
+        salt = bcrypt.gensalt(self.rounds)
+        return self._submit(bcrypt.hashpw, password.encode(), salt)
+
+    def hash(self, password: str) -> bytes:
+        """ This method returns the salted hash of password
+        """
+        return self.hash_async(password).result()
+
+    def verify_async(self, hashed_password: bytes, password: str) -> Future:
+        """ This method returns a future of whether password matches
+        hashed_password
+        """
+        return self._submit(bcrypt.checkpw, password.encode(),
+                            hashed_password)
+
+    def verify(self, hashed_password: bytes, password: str) -> bool:
+        """ This method returns True if password matches hashed_password
+        """
+        return self.verify_async(hashed_password, password).result()
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        """ This method returns True if hashed_password was produced with
+        a cost factor lower than the current one
+        """
+        return hash_rounds(hashed_password) < self.rounds
+
+    def verify_and_update(self, hashed_password: bytes,
+                          password: str) -> Tuple[bool, Optional[bytes]]:
+        """ This method verifies password and, when it matches a hash with
+        an outdated cost factor, also returns a fresh hash to store
+        """
+        if not self.verify(hashed_password, password):
+            return False, None
+        if self.needs_rehash(hashed_password):
+            return True, self.hash(password)
+        return True, None
+
+    def metrics(self) -> dict:
+        """ This method returns the queue depth and hash latency metrics
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            completed = self._completed
+            metrics = {
+                "rounds": self.rounds,
+                "queue_depth": self._queued,
+                "completed": completed,
+                "mean_ms": self._total_ms / completed if completed else 0.0,
+            }
+        for name, quantile in (("p50_ms", 0.5), ("p99_ms", 0.99)):
+            metrics[name] = latencies[int(quantile * (len(latencies) - 1))] \
+                if latencies else 0.0
+        return metrics
+
+    def shutdown(self) -> None:
+        """ This method waits for pending hashes and stops the pool """
+        self._executor.shutdown(wait=True)
+
+
+@lru_cache(maxsize=None)
+def default_hasher() -> PasswordHasher:
+    """ This function returns the process wide PasswordHasher, configured
+    from BCRYPT_ROUNDS, BCRYPT_TARGET_MS and BCRYPT_WORKERS
+    """
+    rounds = os.getenv("BCRYPT_ROUNDS")
+    workers = os.getenv("BCRYPT_WORKERS")
+    return PasswordHasher(
+        rounds=int(rounds) if rounds else None,
+        target_ms=float(os.getenv("BCRYPT_TARGET_MS", "250")),
+        max_workers=int(workers) if workers else None)
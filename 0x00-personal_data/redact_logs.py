@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Command line tool redacting PII from existing log files in parallel."""
+
+import argparse
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum
+
+DEFAULT_CHUNK_SIZE = 8 << 20
+
+
+def chunk_offsets(path: str, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Yields (start, end) byte ranges of path cut on line boundaries."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        while start < size:
+            end = data.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if end == -1 else end + 1
+            yield start, end
+            start = end
+
+
+def redact_chunk(path: str, start: int, end: int, fields: Tuple[str, ...],
+                 redaction: str, separator: str) -> bytes:
+    """Redacts the lines found between start and end in path.
+
+    Runs in a worker process: the chunk is read through the worker's own
+    memory map so only offsets and the redacted bytes cross processes.
+    """
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        text = data[start:end].decode("utf-8", "surrogateescape")
+    return filter_datum(list(fields), redaction, text, separator).encode(
+        "utf-8", "surrogateescape")
+
+
+def redact_file(executor: ProcessPoolExecutor, source: str, destination: str,
+                fields: Tuple[str, ...], redaction: str, separator: str,
+                chunk_size: int, window: int) -> int:
+    """Redacts source into destination and returns the bytes read.
+
+    At most `window` chunks are in flight so memory stays bounded; results
+    are written in submission order, which keeps the original line order.
+    """
+    pending = deque()
+    total = 0
+    with open(destination, "wb") as out:
+        for start, end in chunk_offsets(source, chunk_size):
+            if len(pending) >= window:
+                out.write(pending.popleft().result())
+            pending.append(executor.submit(redact_chunk, source, start, end,
+                                           fields, redaction, separator))
+            total += end - start
+        while pending:
+            out.write(pending.popleft().result())
+    return total
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse the command line options."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+", help="log files to redact")
+    parser.add_argument("--suffix", default=".redacted",
+                        help="suffix appended to each output file name")
+    parser.add_argument("--fields", default=",".join(PII_FIELDS),
+                        help="comma separated list of fields to redact")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="approximate chunk size in bytes")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None):
+    """Redacts every file given on the command line."""
+    args = parse_args(argv)
+    fields = tuple(field for field in args.fields.split(",") if field)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for source in args.files:
+            redact_file(executor, source, source + args.suffix, fields,
+                        RedactingFormatter.REDACTION,
+                        RedactingFormatter.SEPARATOR,
+                        args.chunk_size, 2 * args.workers)
+
+
+if __name__ == "__main__":
+    main()
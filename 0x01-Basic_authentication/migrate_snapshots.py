@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+""" Convert .db_<Class>.json snapshots to the columnar snapshot format
+"""
+from datetime import datetime
+import glob
+import json
+import os
+import sys
+from models.base import TIMESTAMP_FORMAT
+from models.snapshot import TIMESTAMP_COLUMNS, dump_columns, to_epoch
+
+
+def migrate(json_path: str) -> str:
+    """ Replace a JSON snapshot with its columnar twin and return the
+    path of the latter
+    """
+    col_path = json_path[:-len(".json")] + ".col"
+    with open(json_path, 'r') as f:
+        objs_json = json.load(f)
+    rows = []
+    for obj_id, obj_json in objs_json.items():
+        for name in TIMESTAMP_COLUMNS:
+            if obj_json.get(name) is not None:
+                obj_json[name] = to_epoch(datetime.strptime(
+                    obj_json[name], TIMESTAMP_FORMAT))
+        rows.append((obj_id, obj_json))
+    with open(col_path + ".tmp", 'wb') as f:
+        dump_columns(rows, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(col_path + ".tmp", col_path)
+    # A stale JSON snapshot left behind could be loaded after the next
+    # columnar one rotates the journal away
+    os.remove(json_path)
+    return col_path
+
+
+if __name__ == "__main__":
+    for json_path in sys.argv[1:] or glob.glob(".db_*.json"):
+        print("{} -> {}".format(json_path, migrate(json_path)))
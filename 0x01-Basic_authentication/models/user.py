@@ -2,13 +2,20 @@
 """ User module
 """
 import hashlib
+from models import metrics
 from models.base import Base
 
 
+metrics.describe('password_hash_seconds',
+                 "Time spent hashing passwords, by operation", 'histogram')
+
+
 class User(Base):
     """ User class
     """
 
+    indexes = {'email': False}
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
         """
@@ -31,7 +38,9 @@ class User(Base):
         if pwd is None or type(pwd) is not str:
             self._password = None
         else:
-            self._password = hashlib.sha256(pwd.encode()).hexdigest().lower()
+            with metrics.timed('password_hash_seconds', op='set'):
+                self._password = \
+                    hashlib.sha256(pwd.encode()).hexdigest().lower()
 
     def is_valid_password(self, pwd: str) -> bool:
         """ Validate a password
@@ -41,7 +50,9 @@ class User(Base):
         if self.password is None:
             return False
         pwd_e = pwd.encode()
-        return hashlib.sha256(pwd_e).hexdigest().lower() == self.password
+        with metrics.timed('password_hash_seconds', op='verify'):
+            pwd_hash = hashlib.sha256(pwd_e).hexdigest().lower()
+        return pwd_hash == self.password
 
     def display_name(self) -> str:
         """ Display User name based on email/first_name/last_name
@@ -3,8 +3,9 @@
 Route module for the API
 """
 from os import getenv
+from api.v1.auth.auth import PathMatcher, server_timing
 from api.v1.views import app_views
-from flask import Flask, jsonify, abort, request
+from flask import Flask, jsonify, abort, request, g
 from flask_cors import (CORS, cross_origin)
 import os
 
@@ -15,6 +16,12 @@ app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 
 auth = None
+# Compiled once: before_request only walks the trie
+unauthorized_paths = PathMatcher(['/api/v1/status/',
+                                  '/api/v1/auth_session/login/',
+                                  '/api/v1/unauthorized/',
+                                  '/api/v1/forbidden/'
+                                  ])
 
 auth_type = getenv('AUTH_TYPE', None)
 if auth_type == 'auth':
@@ -40,20 +47,27 @@ def before_request():
     """
     if auth is None:
         pass
+    elif not auth.require_auth(request.path, unauthorized_paths):
+        # Excluded paths never need the identity: skip resolving it
+        setattr(request, 'current_user', None)
     else:
+        token = auth.session_cookie(request)
+        if auth.authorization_header(request) is None and token is None:
+            abort(401, description="Unauthorized")
+        # Resolved once per request, reused by the views
         setattr(request, 'current_user', auth.current_user(request))
-        unauthorized_paths = ['/api/v1/status/',
-                              '/api/v1/auth_session/login/',
-                              '/api/v1/unauthorized/',
-                              '/api/v1/forbidden/'
-                              ]
-
-        if auth.require_auth(request.path, unauthorized_paths):
-            token = auth.session_cookie(request)
-            if auth.authorization_header(request) is None and token is None:
-                abort(401, description="Unauthorized")
-            if auth.current_user(request) is None:
-                abort(403, description="Forbidden")
+        if request.current_user is None:
+            abort(403, description="Forbidden")
+
+
+@app.after_request
+def after_request(response):
+    """ Reports the auth resolution stages in a Server-Timing header
+    """
+    timings = g.get('auth_timings')
+    if timings:
+        response.headers['Server-Timing'] = server_timing(timings)
+    return response
 
 
 @app.errorhandler(404)
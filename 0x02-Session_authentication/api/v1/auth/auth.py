@@ -1,36 +1,114 @@
 #!/usr/bin/env python3
 """Auth module."""
-from typing import List, TypeVar
-from flask import request
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple, TypeVar, Union
+from flask import g, has_app_context, request
 import os
+import time
 
 # Define a type variable for the User type
 User = TypeVar('User')
 
 
+class PathMatcher:
+    """Excluded path rules compiled into a character trie.
+
+    A path matches when it walks through a node ending a rule (the rule,
+    or the part of a `*` rule before the star, is a prefix of the path),
+    or when the whole path is consumed inside the trie (the path is a
+    prefix of a rule, exact matches included). A lookup costs
+    O(len(path)) whatever the number of rules.
+    """
+    END = ''
+
+    def __init__(self, paths: Iterable[str]):
+        """Compile the rules.
+
+        Parameters:
+        - paths: The excluded path rules.
+        """
+        self.paths = tuple(paths)
+        self._root = {}
+        for excluded_path in self.paths:
+            if excluded_path.endswith('*'):
+                excluded_path = excluded_path[:-1]
+            node = self._root
+            for char in excluded_path:
+                node = node.setdefault(char, {})
+            node[self.END] = True
+
+    def __len__(self) -> int:
+        """Return the number of rules."""
+        return len(self.paths)
+
+    def match(self, path: str) -> bool:
+        """Return True if the path is excluded by one of the rules."""
+        if not self.paths:
+            return False
+        node = self._root
+        for char in path:
+            if self.END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return True
+
+
+@contextmanager
+def auth_stage(name: str):
+    """Time one stage of the identity resolution.
+
+    The duration is added to flask.g.auth_timings, a stage name -> ms
+    dict scoped to the current request; outside of a request the stage
+    is not recorded.
+
+    Parameters:
+    - name: The stage name, e.g. header_parse, credential_verify or
+      user_fetch.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_app_context():
+            timings = g.setdefault('auth_timings', {})
+            timings[name] = timings.get(name, 0.0) + \
+                (time.perf_counter() - start) * 1000
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Format stage timings as a Server-Timing header value."""
+    return ", ".join("{};dur={:.3f}".format(name, duration)
+                     for name, duration in timings.items())
+
+
+@lru_cache(maxsize=32)
+def compile_paths(paths: Tuple[str, ...]) -> PathMatcher:
+    """Return the cached PathMatcher of a tuple of rules."""
+    return PathMatcher(paths)
+
+
 class Auth:
     """Template for all authentication systems."""
 
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathMatcher]) -> bool:
         """Placeholder method to check if authentication is required for a
-        given path."""
+        given path.
+
+        excluded_paths is either a list of rules, compiled and cached on
+        first use, or a PathMatcher compiled once by the caller.
+        """
         # Return True if path is None
         if path is None:
             return True
         elif excluded_paths is None or len(excluded_paths) == 0:
             return True
-        elif path in excluded_paths:
-            return False
-        else:
-            for excluded_path in excluded_paths:
-                if excluded_path.startswith(path):
-                    return False
-                if path.startswith(excluded_path):
-                    return False
-                if excluded_path[-1] == '*':
-                    if path.startswith(excluded_path[:-1]):
-                        return False
-        return True
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = compile_paths(tuple(excluded_paths))
+        return not excluded_paths.match(path)
 
     def current_user(self, request=None) -> User:
         """Placeholder method to retrieve
@@ -1,14 +1,35 @@
 #!/usr/bin/env python3
 """Basic authentication module."""
-from .auth import Auth
+from .auth import Auth, auth_stage
+from .credential_cache import CredentialCache
 import base64
+import os
 from typing import List, TypeVar, Union, Tuple
+from models import metrics
 from models.user import User
 
 
 class BasicAuth(Auth):
     """Basic authentication class."""
 
+    def __init__(self):
+        """Initialize the BasicAuth class.
+
+        Verified credentials are cached for BASIC_AUTH_CACHE_TTL seconds
+        (300 by default, 0 disables the cache), BASIC_AUTH_CACHE_SIZE
+        caps the number of cached headers.
+        """
+        try:
+            ttl = int(os.getenv('BASIC_AUTH_CACHE_TTL', '300'))
+        except Exception:
+            ttl = 300
+        try:
+            max_entries = int(os.getenv('BASIC_AUTH_CACHE_SIZE', '10000'))
+        except Exception:
+            max_entries = 10000
+        self.credential_cache = CredentialCache(max(ttl, 0),
+                                                max(max_entries, 0))
+
     def extract_base64_authorization_header(
             self, authorization_header: str) -> str:
         """Extracts the Base64 part of the Authorization header for Basic
@@ -96,7 +117,8 @@ class BasicAuth(Auth):
 
         # Search for the user by email
         try:
-            users = User.search({'email': user_email})
+            with auth_stage('user_fetch'):
+                users = User.search({'email': user_email})
         except Exception:
             return None
 
@@ -107,47 +129,83 @@ class BasicAuth(Auth):
             return None
 
         # Check if the password is valid for the found user
-        for user in users:
-            if user.is_valid_password(user_pwd):
-                return user
+        with auth_stage('credential_verify'):
+            for user in users:
+                if user.is_valid_password(user_pwd):
+                    return user
 
         return None
 
-    def current_user(self, request=None) -> User:
+    def _credentials(self, request) -> Tuple[str, str]:
         """
-        Retrieves the User instance for a request.
+        Extracts the user credentials from the Authorization header of a
+        request.
 
         Parameters:
         - request: The request object.
 
         Returns:
-        - The User instance if the request is authenticated, otherwise None.
+        - A tuple containing the user email and password, or (None, None).
         """
-        if request is None:
-            return None
-
         # Extract the Authorization header
         authorization_header = self.authorization_header(request)
         if authorization_header is None:
-            return None
+            return (None, None)
 
         # Extract the Base64 part of the Authorization header
         base64_header = self.extract_base64_authorization_header(
             authorization_header)
         if base64_header is None:
-            return None
+            return (None, None)
 
         # Decode the Base64 encoded string
         decoded_base64_header = \
             self.decode_base64_authorization_header(base64_header)
         if decoded_base64_header is None:
-            return None
+            return (None, None)
 
         # Extract the user credentials
-        user_email, user_pwd = self.extract_user_credentials(
-            decoded_base64_header)
+        return self.extract_user_credentials(decoded_base64_header)
+
+    def current_user(self, request=None) -> User:
+        """
+        Retrieves the User instance for a request.
+
+        Parameters:
+        - request: The request object.
+
+        Returns:
+        - The User instance if the request is authenticated, otherwise None.
+        """
+        if request is None:
+            return None
+
+        cache = self.credential_cache
+        key = None
+        authorization_header = self.authorization_header(request)
+        if cache.enabled and isinstance(authorization_header, str):
+            # Known header: skip decoding, the search and the hashing
+            try:
+                with auth_stage('user_fetch'):
+                    key = cache.key(authorization_header)
+                    user = cache.get(key, User.get)
+            except Exception:
+                user = None
+            if user is not None:
+                metrics.inc('logins_total', method='basic', result='success')
+                return user
+
+        with auth_stage('header_parse'):
+            user_email, user_pwd = self._credentials(request)
         if user_email is None or user_pwd is None:
             return None
 
         # Retrieve the User instance from the database
-        return self.user_object_from_credentials(user_email, user_pwd)
+        user = self.user_object_from_credentials(user_email, user_pwd)
+        if user is None:
+            metrics.inc('logins_total', method='basic', result='failure')
+            return None
+        metrics.inc('logins_total', method='basic', result='success')
+        if key is not None:
+            cache.put(key, user.id, user.password)
+        return user
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Verified credentials cache module."""
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CredentialCache:
+    """Authorization header -> user ID cache of verified credentials.
+
+    Headers are keyed by their HMAC-SHA256 under a per-process secret,
+    so neither the header nor the password is kept in memory. Each entry
+    also holds the password hash the credentials were verified against.
+    Nothing invalidates entries when a user changes: each hit compares
+    that hash, in constant time, with the one of the user as currently
+    loaded, and drops the entry if the user is gone or the hashes differ.
+    """
+
+    def __init__(self, ttl: int = 300, max_entries: int = 10000,
+                 secret: bytes = None, clock=time.monotonic):
+        """Initialize a CredentialCache.
+
+        Args:
+            ttl (int): Seconds an entry lives, 0 disables the cache.
+            max_entries (int): Maximum number of entries, 0 for no cap.
+            secret (bytes): HMAC key, random by default.
+            clock: Callable returning the current time in seconds.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._secret = secret or os.urandom(32)
+        self._clock = clock
+        self._lock = threading.Lock()
+        # digest -> (user_id, password hash, expires_at)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidated = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Return True when entries are kept."""
+        return self.ttl > 0
+
+    def key(self, authorization_header: str) -> bytes:
+        """Return the cache key of a raw Authorization header."""
+        return hmac.digest(self._secret, authorization_header.encode(),
+                           'sha256')
+
+    def get(self, key: bytes, fetch_user):
+        """Return the user whose credentials are cached under key.
+
+        Args:
+            key (bytes): Cache key of the Authorization header.
+            fetch_user: Callable returning the User of a user ID, or None.
+
+        Returns:
+            The User if the entry is live and the password hash still
+            matches, None otherwise.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= self._clock():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        user = fetch_user(entry[0])
+        current_hash = getattr(user, 'password', None)
+        with self._lock:
+            if user is None or not self.matches(entry[1], current_hash):
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    self.invalidated += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+        return user
+
+    def put(self, key: bytes, user_id: str, password_hash: str):
+        """Cache verified credentials, evicting the least recently used
+        entry if full."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (user_id, password_hash,
+                                  self._clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while 0 < self.max_entries < len(self._entries):
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    @staticmethod
+    def matches(password_hash: str, current_hash: str) -> bool:
+        """Compare two password hashes in constant time."""
+        if password_hash is None or current_hash is None:
+            return False
+        return hmac.compare_digest(password_hash, current_hash)
+
+    def stats(self) -> dict:
+        """Return entry, hit, miss, hit rate and eviction counts."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'expired': self.expired, 'evicted': self.evicted,
+                    'invalidated': self.invalidated}
@@ -1,13 +1,25 @@
 #!/usr/bin/env python3
 """Session authentication module."""
-from .auth import Auth
+from .auth import Auth, auth_stage
+from .session_backends import session_backend_from_env
+from .session_store import SessionStore
 import uuid
 from models.user import User
 
 
 class SessionAuth(Auth):
     """Session authentication class."""
-    user_id_by_session_id = {}
+    user_id_by_session_id = SessionStore()
+
+    def __init__(self):
+        """Initialize the SessionAuth class.
+
+        A shared backend selected by SESSION_BACKEND replaces the
+        in-process session store of the class.
+        """
+        backend = session_backend_from_env()
+        if backend is not None:
+            self.user_id_by_session_id = backend
 
     def create_session(self, user_id: str = None) -> str:
         """Create a session for a user.
@@ -25,6 +37,16 @@ class SessionAuth(Auth):
         self.user_id_by_session_id[session_id] = user_id
         return session_id
 
+    def session_count(self) -> int:
+        """Return the number of live sessions.
+
+        Shared backends count them on their own index; the in-process
+        store keeps its size.
+        """
+        store = self.user_id_by_session_id
+        count = getattr(store, 'count', None)
+        return count() if count is not None else len(store)
+
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """Retrieve the user ID for a given session ID.
 
@@ -52,19 +74,21 @@ class SessionAuth(Auth):
         """
 
         # Retrieve the session cookie value
-        session_cookie_value = self.session_cookie(request)
+        with auth_stage('header_parse'):
+            session_cookie_value = self.session_cookie(request)
         if session_cookie_value is None:
             return None
 
         # Retrieve the user ID for the session ID
-        user_id = self.user_id_for_session_id(session_cookie_value)
+        with auth_stage('credential_verify'):
+            user_id = self.user_id_for_session_id(session_cookie_value)
         if user_id is None:
             return None
 
         # Retrieve the User instance from the database
         try:
-            user = User.get(user_id)
-            return user
+            with auth_stage('user_fetch'):
+                return User.get(user_id)
         except Exception:
             return None
 
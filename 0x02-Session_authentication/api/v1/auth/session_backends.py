@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""Shared session backends module.
+
+Every backend is a mutable mapping of session ID to session value, like
+SessionStore, so SessionAuth and its subclasses use any of them as
+user_id_by_session_id. SESSION_BACKEND selects one:
+
+- memory (default): in-process SessionStore.
+- sqlite: a SQLite file shared by every worker of the host,
+  SESSION_BACKEND_URL is the database path.
+- redis: a Redis-protocol server, SESSION_BACKEND_URL is
+  redis://host:port/db.
+"""
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Iterator, List
+from urllib.parse import urlparse
+
+
+def encode_value(value) -> str:
+    """Serialize a session value, datetimes included, to JSON."""
+    def default(obj):
+        if isinstance(obj, datetime):
+            return {'__datetime__': obj.isoformat()}
+        raise TypeError(type(obj).__name__)
+    return json.dumps(value, default=default)
+
+
+def decode_value(data: str):
+    """Deserialize a session value produced by encode_value."""
+    def object_hook(obj):
+        if list(obj) == ['__datetime__']:
+            return datetime.fromisoformat(obj['__datetime__'])
+        return obj
+    return json.loads(data, object_hook=object_hook)
+
+
+class SQLiteSessionBackend(MutableMapping):
+    """Sessions in a SQLite table shared by every process of the host."""
+    shared = True
+
+    def __init__(self, db_path: str = '.sessions.db', ttl: int = 0):
+        """Initialize the backend and create its table.
+
+        Args:
+            db_path (str): Path of the SQLite database file.
+            ttl (int): Seconds a session lives, 0 for no expiry.
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at "
+                         "ON sessions (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the connection of the current thread."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expires_at(self) -> float:
+        """Return the expiry time of a session written now."""
+        return time.time() + self.ttl if self.ttl > 0 else float('inf')
+
+    def __getitem__(self, session_id: str):
+        """Return a live session value."""
+        row = self._connection().execute(
+            "SELECT value FROM sessions WHERE session_id = ? "
+            "AND expires_at > ?", (session_id, time.time())).fetchone()
+        if row is None:
+            raise KeyError(session_id)
+        return decode_value(row[0])
+
+    def get_many(self, session_ids: List[str]) -> dict:
+        """Return the live values of several sessions in one query."""
+        if not session_ids:
+            return {}
+        marks = ",".join("?" * len(session_ids))
+        rows = self._connection().execute(
+            "SELECT session_id, value FROM sessions WHERE session_id IN "
+            "({}) AND expires_at > ?".format(marks),
+            list(session_ids) + [time.time()])
+        return {session_id: decode_value(value) for session_id, value in rows}
+
+    def __setitem__(self, session_id: str, value):
+        """Store a session, purging expired ones every 1000 writes."""
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                     (session_id, encode_value(value), self._expires_at()))
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?",
+                         (time.time(),))
+
+    def __delitem__(self, session_id: str):
+        """Remove a session."""
+        cursor = self._connection().execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        if cursor.rowcount == 0:
+            raise KeyError(session_id)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the live session IDs."""
+        rows = self._connection().execute(
+            "SELECT session_id FROM sessions WHERE expires_at > ?",
+            (time.time(),)).fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        """Return the number of live sessions."""
+        return self.count()
+
+    def count(self) -> int:
+        """Return the number of live sessions, counted on the expiry
+        index without reading the table."""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at > ?",
+            (time.time(),)).fetchone()[0]
+
+
+class RedisError(Exception):
+    """Error reply sent by a Redis-protocol server."""
+
+
+class RedisConnection:
+    """One RESP connection to a Redis-protocol server."""
+
+    def __init__(self, host: str, port: int, db: int = 0,
+                 timeout: float = 5.0):
+        """Connect and select the database."""
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile('rb')
+        if db:
+            self.execute('SELECT', db)
+
+    @staticmethod
+    def _pack(args) -> bytes:
+        """Encode one command as a RESP array of bulk strings."""
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read(self):
+        """Read one RESP reply."""
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise RedisError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            length = int(body)
+            if length < 0:
+                return None
+            return [self._read() for _ in range(length)]
+        raise RedisError("unknown reply type {!r}".format(kind))
+
+    def pipeline(self, commands: List[tuple]) -> list:
+        """Send several commands in one write, then read every reply.
+
+        Error replies are returned in place instead of raised.
+        """
+        self._sock.sendall(b"".join(self._pack(c) for c in commands))
+        replies = []
+        for _ in commands:
+            try:
+                replies.append(self._read())
+            except RedisError as e:
+                replies.append(e)
+        return replies
+
+    def execute(self, *args):
+        """Send one command and return its reply."""
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def close(self):
+        """Close the connection."""
+        self._reader.close()
+        self._sock.close()
+
+
+class RedisConnectionPool:
+    """Bounded pool of RedisConnection objects shared by threads."""
+
+    def __init__(self, host: str, port: int, db: int = 0,
+                 max_connections: int = 16):
+        """Initialize an empty pool."""
+        self.host, self.port, self.db = host, port, db
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def acquire(self) -> RedisConnection:
+        """Take an idle connection, or open one if under the limit."""
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return RedisConnection(self.host, self.port, self.db)
+            except Exception:
+                self._slots.release()
+                raise
+
+    def release(self, conn: RedisConnection, broken: bool = False):
+        """Give a connection back, dropping it if it failed."""
+        if broken:
+            conn.close()
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    def run(self, commands: List[tuple]) -> list:
+        """Run a pipeline of commands on a pooled connection."""
+        conn = self.acquire()
+        try:
+            replies = conn.pipeline(commands)
+        except Exception:
+            self.release(conn, broken=True)
+            raise
+        self.release(conn)
+        return replies
+
+
+class RedisSessionBackend(MutableMapping):
+    """Sessions in a Redis-protocol key-value server.
+
+    Besides one key per session, a sorted set holds every session ID
+    scored by its expiry time, written in the same pipeline as the key.
+    Counting the live sessions trims it and reads its size, instead of
+    scanning the keyspace.
+    """
+    shared = True
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', ttl: int = 0,
+                 prefix: str = 'session:', max_connections: int = 16):
+        """Initialize the backend.
+
+        Args:
+            url (str): redis://host:port/db address of the server.
+            ttl (int): Seconds a session lives, 0 for no expiry.
+            prefix (str): Key prefix of the sessions.
+            max_connections (int): Size of the connection pool.
+        """
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip('/') or 0)
+        self.pool = RedisConnectionPool(parsed.hostname or 'localhost',
+                                        parsed.port or 6379, db,
+                                        max_connections)
+        self.ttl = ttl
+        self.prefix = prefix
+        # Outside of the prefix, so SCAN never returns it
+        self.index_key = 'index:' + prefix
+
+    def _execute(self, *args):
+        """Run one command on a pooled connection."""
+        reply = self.pool.run([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def __getitem__(self, session_id: str):
+        """Return a session value."""
+        data = self._execute('GET', self.prefix + session_id)
+        if data is None:
+            raise KeyError(session_id)
+        return decode_value(data)
+
+    def get_many(self, session_ids: List[str]) -> dict:
+        """Return the values of several sessions with pipelined GETs."""
+        replies = self.pool.run([('GET', self.prefix + session_id)
+                                 for session_id in session_ids])
+        return {session_id: decode_value(data)
+                for session_id, data in zip(session_ids, replies)
+                if isinstance(data, str)}
+
+    def _run(self, commands: List[tuple]) -> list:
+        """Run a pipeline, raising its first error reply."""
+        replies = self.pool.run(commands)
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def __setitem__(self, session_id: str, value):
+        """Store a session, with an expiry when ttl is set."""
+        args = ['SET', self.prefix + session_id, encode_value(value)]
+        expires_at = '+inf'
+        if self.ttl > 0:
+            args += ['EX', self.ttl]
+            expires_at = time.time() + self.ttl
+        self._run([tuple(args),
+                   ('ZADD', self.index_key, expires_at, session_id)])
+
+    def __delitem__(self, session_id: str):
+        """Remove a session."""
+        deleted, _ = self._run([('DEL', self.prefix + session_id),
+                                ('ZREM', self.index_key, session_id)])
+        if deleted == 0:
+            raise KeyError(session_id)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the session IDs with SCAN."""
+        cursor = '0'
+        while True:
+            cursor, keys = self._execute('SCAN', cursor, 'MATCH',
+                                         self.prefix + '*', 'COUNT', 1000)
+            for key in keys:
+                yield key[len(self.prefix):]
+            if cursor == '0':
+                return
+
+    def __len__(self) -> int:
+        """Return the number of live sessions."""
+        return self.count()
+
+    def count(self) -> int:
+        """Return the number of live sessions in one round trip,
+        dropping the expired ones from the index."""
+        _, count = self._run([
+            ('ZREMRANGEBYSCORE', self.index_key, '-inf', time.time()),
+            ('ZCARD', self.index_key)])
+        return count
+
+
+def session_backend_from_env():
+    """Build the backend selected by SESSION_BACKEND.
+
+    Returns:
+        A new shared backend, or None for the default in-process store.
+    """
+    name = os.getenv('SESSION_BACKEND', 'memory')
+    url = os.getenv('SESSION_BACKEND_URL')
+    if name == 'sqlite':
+        return SQLiteSessionBackend(url or '.sessions.db')
+    if name == 'redis':
+        return RedisSessionBackend(url or 'redis://localhost:6379/0')
+    if name != 'memory':
+        raise ValueError("Unknown SESSION_BACKEND: {}".format(name))
+    return None
@@ -22,15 +22,29 @@ class SessionDBAuth(SessionExpAuth):
         }
         user = UserSession(**kwags)
         user.save()
-        UserSession.save_to_file()
         return session_id
 
+    def session_count(self):
+        """Return the number of live UserSession rows, of every worker."""
+        UserSession.refresh_from_file()
+        if self.session_duration <= 0:
+            return UserSession.count()
+        return UserSession.count_since(
+            datetime.utcnow() - timedelta(seconds=self.session_duration))
+
     def user_id_for_session_id(self, session_id=None):
         """Retrieve the user ID for a given session ID from the database."""
         if session_id is None:
             return None
 
-        UserSession.load_from_file()
+        # A shared backend is seen by every worker: trust it when it hits
+        if getattr(self.user_id_by_session_id, 'shared', False):
+            user_id = super().user_id_for_session_id(session_id)
+            if user_id is not None:
+                return user_id
+
+        # Only re-reads what other workers appended since the last request
+        UserSession.refresh_from_file()
         user_session = UserSession.search({'session_id': session_id})
         if not user_session:
             return None
@@ -54,10 +68,15 @@ class SessionDBAuth(SessionExpAuth):
         if not session_id:
             return False
 
+        try:
+            del self.user_id_by_session_id[session_id]
+        except KeyError:
+            pass
+
+        UserSession.refresh_from_file()
         user_session = UserSession.search({'session_id': session_id})
         if user_session:
             user_session = user_session[0]
             user_session.remove()
-            UserSession.save_to_file()
             return True
         return False
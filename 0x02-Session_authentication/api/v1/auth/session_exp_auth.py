@@ -4,18 +4,41 @@
 import os
 from datetime import datetime, timedelta
 from .session_auth import SessionAuth
+from .session_store import SessionStore
 
 
 class SessionExpAuth(SessionAuth):
     """Session authentication class with expiration."""
+    user_id_by_session_id = SessionStore()
 
     def __init__(self):
-        """Initialize the SessionExpAuth class."""
+        """Initialize the SessionExpAuth class.
+
+        SESSION_DURATION sets the session lifetime in seconds. With the
+        in-process store, SESSION_MAX_COUNT caps the number of live
+        sessions (least recently used first out) and SESSION_SLIDING=1
+        restarts the lifetime on every access.
+        """
+        super().__init__()
         duration_str = os.getenv('SESSION_DURATION')
         try:
             self.session_duration = int(duration_str)
         except Exception:
             self.session_duration = 0
+        try:
+            max_sessions = int(os.getenv('SESSION_MAX_COUNT', '0'))
+        except Exception:
+            max_sessions = 0
+        self.sliding = os.getenv('SESSION_SLIDING', '0') == '1'
+
+        store = self.user_id_by_session_id
+        store.ttl = max(self.session_duration, 0)
+        if isinstance(store, SessionStore):
+            store.max_sessions = max_sessions
+            store.sliding = self.sliding
+        else:
+            # Shared backends only expire from creation
+            self.sliding = False
 
     def create_session(self, user_id=None):
         """Create a session for a user with expiration."""
@@ -43,7 +66,8 @@ class SessionExpAuth(SessionAuth):
         if 'created_at' not in session_info.keys():
             return None
 
-        if self.session_duration <= 0:
+        # The store already enforces the (sliding) expiry
+        if self.session_duration <= 0 or self.sliding:
             return session_info.get('user_id')
 
         created_at = session_info.get('created_at')
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Expiring session store module."""
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Iterator
+
+NEVER = float('inf')
+
+
+class SessionStore(MutableMapping):
+    """Session ID -> session value mapping with expiry and a size cap.
+
+    Expiry deadlines live in a min-heap holding at most one live entry
+    per session, so each expired session is evicted once in O(log n).
+    Sliding expiration only moves the deadline of the session; the heap
+    entry is pushed again when it surfaces. Once max_sessions is reached
+    the least recently used session is evicted.
+    """
+
+    def __init__(self, ttl: int = 0, max_sessions: int = 0,
+                 sliding: bool = False, clock=time.monotonic):
+        """Initialize a SessionStore.
+
+        Args:
+            ttl (int): Seconds a session lives, 0 for no expiry.
+            max_sessions (int): Maximum number of sessions, 0 for no cap.
+            sliding (bool): Restart the ttl on every access.
+            clock: Callable returning the current time in seconds.
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sliding = sliding
+        self._clock = clock
+        self._lock = threading.RLock()
+        # session_id -> [value, expires_at, deadline queued in the heap]
+        self._entries = OrderedDict()
+        self._heap = []
+        self.expired = 0
+        self.evicted = 0
+
+    def _deadline(self, now: float) -> float:
+        """Return the expiry time of a session touched at now."""
+        return now + self.ttl if self.ttl > 0 else NEVER
+
+    def _expire(self, now: float):
+        """Evict every session whose deadline has passed."""
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            queued, session_id = heapq.heappop(heap)
+            entry = self._entries.get(session_id)
+            if entry is None or entry[2] != queued:
+                continue
+            if entry[1] <= now:
+                del self._entries[session_id]
+                self.expired += 1
+            else:
+                # Slid forward since it was queued
+                entry[2] = entry[1]
+                heapq.heappush(heap, (entry[1], session_id))
+
+    def __setitem__(self, session_id: str, value):
+        """Store a session, evicting the least recently used if full."""
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            expires_at = self._deadline(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                entry = [value, expires_at, NEVER]
+                self._entries[session_id] = entry
+            else:
+                entry[0], entry[1] = value, expires_at
+                self._entries.move_to_end(session_id)
+            if expires_at < entry[2]:
+                entry[2] = expires_at
+                heapq.heappush(self._heap, (expires_at, session_id))
+            while 0 < self.max_sessions < len(self._entries):
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def __getitem__(self, session_id: str):
+        """Return a live session value, refreshing its LRU position."""
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            entry = self._entries[session_id]
+            if entry[1] <= now:
+                del self._entries[session_id]
+                self.expired += 1
+                raise KeyError(session_id)
+            self._entries.move_to_end(session_id)
+            if self.sliding:
+                entry[1] = self._deadline(now)
+            return entry[0]
+
+    def __delitem__(self, session_id: str):
+        """Remove a session."""
+        with self._lock:
+            del self._entries[session_id]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the live session IDs."""
+        with self._lock:
+            self._expire(self._clock())
+            return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        """Return the number of live sessions."""
+        with self._lock:
+            self._expire(self._clock())
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        """Return live, expired and evicted session counts."""
+        return {'sessions': len(self), 'expired': self.expired,
+                'evicted': self.evicted}
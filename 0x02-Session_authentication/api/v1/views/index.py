@@ -1,8 +1,43 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
-from flask import jsonify, abort
+from flask import Response, jsonify, abort
 from api.v1.views import app_views
+from models import metrics
+from models.base import Base
+import re
+import time
+
+
+metrics.describe('logins_total',
+                 "Login attempts, by authentication method and result")
+metrics.describe('model_objects', "Objects stored, by model", 'gauge')
+metrics.describe('active_sessions', "Live sessions", 'gauge')
+# Seconds a session count is served before the backend is asked again:
+# monitoring polls /stats and /metrics constantly
+SESSIONS_CACHE_SECONDS = 1.0
+# (time counted, count) of the last count
+SESSIONS_CACHE = [float('-inf'), None]
+
+
+def plural_name(s_class: str) -> str:
+    """ Stats key of a model class: UserSession -> user_sessions
+    """
+    return re.sub(r'(?<!^)([A-Z])', r'_\1', s_class).lower() + "s"
+
+
+def active_sessions() -> int:
+    """ Number of live sessions, None without session authentication
+    """
+    from api.v1.app import auth
+    if getattr(auth, 'session_count', None) is None:
+        return None
+    counted_at, count = SESSIONS_CACHE
+    now = time.monotonic()
+    if now - counted_at >= SESSIONS_CACHE_SECONDS:
+        count = auth.session_count()
+        SESSIONS_CACHE[:] = [now, count]
+    return count
 
 
 @app_views.route('/status', methods=['GET'], strict_slashes=False)
@@ -19,13 +54,58 @@ def stats() -> str:
     """ GET /api/v1/stats
     Return:
       - the number of each objects
+      - the number of active sessions, with session auth
+      - the login successes and failures by authentication method
+      - the password hashing latency histogram, by operation
+      - the verified credentials cache counters, with Basic auth
     """
-    from models.user import User
+    from api.v1.app import auth
     stats = {}
-    stats['users'] = User.count()
+    for s_class, count in Base.counts().items():
+        stats[plural_name(s_class)] = count
+    stats.setdefault('users', 0)
+    sessions = active_sessions()
+    if sessions is not None:
+        stats['active_sessions'] = sessions
+    logins = {}
+    for key, value in metrics.collect().items():
+        if key[0] != 'logins_total':
+            continue
+        labels = dict(key[1])
+        method = logins.setdefault(labels['method'],
+                                   {'success': 0, 'failure': 0})
+        method[labels['result']] = value
+    stats['logins'] = logins
+    stats['password_hash_seconds'] = {
+        op: metrics.histogram('password_hash_seconds', op=op)
+        for op in ('set', 'verify')}
+    cache = getattr(auth, 'credential_cache', None)
+    if cache is not None:
+        stats['credential_cache'] = cache.stats()
     return jsonify(stats)
 
 
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def prometheus_metrics() -> str:
+    """ GET /api/v1/metrics
+    Return:
+      - the stats in the Prometheus text exposition format
+    """
+    from api.v1.app import auth
+    gauges = {}
+    for s_class, count in Base.counts().items():
+        gauges[('model_objects', (('model', s_class),))] = count
+    sessions = active_sessions()
+    if sessions is not None:
+        gauges[('active_sessions', ())] = sessions
+    cache = getattr(auth, 'credential_cache', None)
+    if cache is not None:
+        for name, value in cache.stats().items():
+            gauges[('credential_cache_' + name, ())] = value
+    return Response(metrics.prometheus(gauges),
+                    mimetype='text/plain; version=0.0.4')
+
+
 @app_views.route('/unauthorized', methods=['GET'], strict_slashes=False)
 def unauthorized() -> str:
     """ GET /api/v1/unauthorized
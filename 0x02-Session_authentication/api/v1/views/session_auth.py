@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Session authentication module."""
 from flask import request, jsonify, abort
+from models import metrics
 from models.user import User
 from api.v1.views import app_views
 import os
@@ -18,6 +19,7 @@ def login():
 
     users = User.search({'email': email})
     if not users or users == []:
+        metrics.inc('logins_total', method='session', result='failure')
         return jsonify({"error": "no user found for this email"}), 404
 
     for user in users:
@@ -27,7 +29,9 @@ def login():
             response = jsonify(user.to_json())
             SESSION_NAME = os.getenv('SESSION_NAME')
             response.set_cookie(SESSION_NAME, session_id)
+            metrics.inc('logins_total', method='session', result='success')
             return response
+    metrics.inc('logins_total', method='session', result='failure')
     return jsonify({"error": "wrong password"}), 401
 
 
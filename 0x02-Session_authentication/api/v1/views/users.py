@@ -2,18 +2,179 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request, stream_with_context
+from models.base import VersionConflict
 from models.user import User
+from typing import Tuple
+import base64
+import json
+import os
+
+
+# Default and maximum page size of GET /api/v1/users
+PAGE_LIMIT = 100
+PAGE_MAX_LIMIT = 1000
+# Rows committed together by POST /api/v1/users/import
+IMPORT_BATCH_SIZE = int(os.getenv('USERS_IMPORT_BATCH_SIZE', '1000'))
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): page size, 100 by default, at most 1000
+      - cursor (optional): X-Next-Cursor of the previous page
+      - fields (optional): comma separated attributes to return
+      - pretty (optional): 0 for compact JSON
+      - any other: equality filter on that public attribute, except
+        the timestamps
+    Return:
+      - list of User objects JSON represented, oldest first, with the
+        cursor of the next page in X-Next-Cursor
+      - 400 if a parameter is invalid
+    """
+    args = request.args.to_dict()
+    try:
+        limit = int(args.pop('limit', PAGE_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= PAGE_MAX_LIMIT:
+        return jsonify({'error': "Wrong limit"}), 400
+    after = None
+    cursor = args.pop('cursor', None)
+    if cursor:
+        try:
+            after = tuple(json.loads(base64.urlsafe_b64decode(cursor)))
+        except Exception:
+            after = None
+        if after is None or len(after) != 2 or \
+                type(after[0]) is not int or type(after[1]) is not str:
+            return jsonify({'error': "Wrong cursor"}), 400
+    fields = args.pop('fields', None)
+    pretty = args.pop('pretty', '1') not in ('0', 'false')
+    # Only what a User JSON shows can be filtered on: a filter on the
+    # password hash would let callers test guesses. Timestamps are kept
+    # to the microsecond but shown to the second, so no string matches
+    public = User().to_json()
+    for attr in args:
+        if attr not in public or attr in ('created_at', 'updated_at'):
+            return jsonify({'error': "Wrong filter: {}".format(attr)}), 400
+
+    users, after = User.page(args, after, limit)
+    all_users = []
+    for user in users:
+        user_json = user.to_json()
+        if fields:
+            user_json = {field: user_json.get(field)
+                         for field in fields.split(",")
+                         if field in user_json}
+        all_users.append(user_json)
+    if pretty:
+        response = jsonify(all_users)
+    else:
+        response = Response(json.dumps(all_users, separators=(',', ':')),
+                            mimetype='application/json')
+    if after is not None:
+        response.headers['X-Next-Cursor'] = base64.urlsafe_b64encode(
+            json.dumps(after).encode()).decode()
+    return response
+
+
+@app_views.route('/users/export', methods=['GET'], strict_slashes=False)
+def export_users() -> str:
+    """ GET /api/v1/users/export
+    Return:
+      - all User objects, one JSON per line (NDJSON), streamed
+    """
+    def generate():
+        for user in User.iter_all():
+            yield json.dumps(user.to_json()) + "\n"
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+def user_from_json(rj) -> Tuple[User, str]:
+    """ Build a new User from the JSON of POST /users or of one NDJSON
+    import line
+    Return:
+      - the unsaved User and None, or None and the error message
+    """
+    if not isinstance(rj, dict):
+        return None, "Wrong format"
+    if rj.get("email", "") == "":
+        return None, "email missing"
+    if rj.get("password", "") == "":
+        return None, "password missing"
+    try:
+        user = User()
+        user.email = rj.get("email")
+        user.password = rj.get("password")
+        user.first_name = rj.get("first_name")
+        user.last_name = rj.get("last_name")
+    except Exception as e:
+        return None, "Can't create User: {}".format(e)
+    return user, None
+
+
+def import_row(line: bytes) -> Tuple[User, str]:
+    """ Build the User of one NDJSON import line
+    Return:
+      - the unsaved User and None, or None and the error message
+    """
+    try:
+        rj = json.loads(line)
+    except ValueError:
+        rj = None
+    return user_from_json(rj)
+
+
+def import_batch(batch: list) -> list:
+    """ Save the valid rows of a batch in one journal write
+    Return:
+      - the result of each (line number, line) of the batch
+    """
+    results = []
+    with User.unit_of_work():
+        for line_no, line in batch:
+            user, error_msg = import_row(line)
+            if user is None:
+                results.append({'line': line_no, 'error': error_msg})
+                continue
+            try:
+                user.save()
+                results.append({'line': line_no, 'id': user.id})
+            except Exception as e:
+                results.append({'line': line_no,
+                                'error': "Can't create User: {}".format(e)})
+    return results
+
+
+@app_views.route('/users/import', methods=['POST'], strict_slashes=False)
+def import_users() -> str:
+    """ POST /api/v1/users/import
+    NDJSON body, one User per line:
+      - email
+      - password
+      - last_name (optional)
+      - first_name (optional)
     Return:
-      - list of all User objects JSON represented
+      - per line, streamed as NDJSON: the new User ID, or the error
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    def generate():
+        batch = []
+        line_no = 0
+        for line in iter(request.stream.readline, b""):
+            line_no += 1
+            if line.strip() == b"":
+                continue
+            batch.append((line_no, line))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                for result in import_batch(batch):
+                    yield json.dumps(result) + "\n"
+                batch = []
+        for result in import_batch(batch):
+            yield json.dumps(result) + "\n"
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson')
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -21,8 +182,11 @@ def view_one_user(user_id: str = None) -> str:
     """ GET /api/v1/users/:id
     Path parameter:
       - User ID
+    Header:
+      - If-None-Match (optional): ETag of a cached copy
     Return:
-      - User object JSON represented
+      - User object JSON represented, with its ETag
+      - 304 if the User still matches If-None-Match
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
@@ -31,12 +195,25 @@ def view_one_user(user_id: str = None) -> str:
         abort(404)
     if user_id == "me" and request.current_user is not None:
         user = request.current_user
-        return jsonify(user.to_json())
-    user = User.get(user_id)
+    else:
+        user = User.get(user_id)
     if user is None:
         abort(404)
+    return user_response(user)
 
-    return jsonify(user.to_json())
+
+def user_response(user: User, status: int = 200) -> str:
+    """ User object JSON represented, tagged with its ETag, or 304 with
+    no body if it matches the If-None-Match of the request
+    """
+    etag = user.etag
+    if request.method == 'GET' and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(user.to_json())
+        response.status_code = status
+    response.set_etag(etag)
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -70,26 +247,15 @@ def create_user() -> str:
       - 400 if can't create the new User
     """
     rj = None
-    error_msg = None
     try:
         rj = request.get_json()
     except Exception as e:
         rj = None
-    if rj is None:
-        error_msg = "Wrong format"
-    if error_msg is None and rj.get("email", "") == "":
-        error_msg = "email missing"
-    if error_msg is None and rj.get("password", "") == "":
-        error_msg = "password missing"
-    if error_msg is None:
+    user, error_msg = user_from_json(rj)
+    if user is not None:
         try:
-            user = User()
-            user.email = rj.get("email")
-            user.password = rj.get("password")
-            user.first_name = rj.get("first_name")
-            user.last_name = rj.get("last_name")
             user.save()
-            return jsonify(user.to_json()), 201
+            return user_response(user, 201)
         except Exception as e:
             error_msg = "Can't create User: {}".format(e)
     return jsonify({'error': error_msg}), 400
@@ -100,19 +266,27 @@ def update_user(user_id: str = None) -> str:
     """ PUT /api/v1/users/:id
     Path parameter:
       - User ID
+    Header:
+      - If-Match (optional): ETag the update applies to
     JSON body:
       - last_name (optional)
       - first_name (optional)
     Return:
-      - User object JSON represented
+      - User object JSON represented, with its new ETag
       - 404 if the User ID doesn't exist
       - 400 if can't update the User
+      - 412 if the User no longer matches If-Match
     """
     if user_id is None:
         abort(404)
     user = User.get(user_id)
     if user is None:
         abort(404)
+    if_version = None
+    if request.if_match:
+        if not request.if_match.contains(user.etag):
+            return jsonify({'error': "Precondition failed"}), 412
+        if_version = user._version
     rj = None
     try:
         rj = request.get_json()
@@ -120,9 +294,14 @@ def update_user(user_id: str = None) -> str:
         rj = None
     if rj is None:
         return jsonify({'error': "Wrong format"}), 400
+    # Update a copy: a rejected save leaves the stored User untouched
+    user = User(**user.to_json(True))
     if rj.get('first_name') is not None:
         user.first_name = rj.get('first_name')
     if rj.get('last_name') is not None:
         user.last_name = rj.get('last_name')
-    user.save()
-    return jsonify(user.to_json()), 200
+    try:
+        user.save(if_version)
+    except VersionConflict:
+        return jsonify({'error': "Precondition failed"}), 412
+    return user_response(user)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+""" Benchmark of BasicAuth.current_user with and without the verified
+credentials cache, at several header hit rates
+"""
+import base64
+import os
+import random
+import sys
+import time
+from api.v1.auth.basic_auth import BasicAuth
+from benchmark_search import populate
+
+
+class FakeRequest():
+    """ Bare request carrying an Authorization header
+    """
+
+    def __init__(self, header: str):
+        """ Initialize a FakeRequest
+        """
+        self.headers = {'Authorization': header}
+
+
+def basic_header(email: str, pwd: str) -> str:
+    """ Authorization header of the credentials
+    """
+    return "Basic " + base64.b64encode(
+        "{}:{}".format(email, pwd).encode()).decode()
+
+
+def build_requests(users: list, count: int, hit_rate: float) -> list:
+    """ count requests: a hit_rate share resend one of a few hot headers,
+    the others are each sent once
+    """
+    hot = [FakeRequest(basic_header(u.email, "pwd")) for u in users[:50]]
+    requests = []
+    for i in range(count):
+        if random.random() < hit_rate:
+            requests.append(random.choice(hot))
+        else:
+            # Extra spaces: same credentials, never seen header
+            user = users[i % len(users)]
+            padding = " " * (2 + i // len(users))
+            requests.append(FakeRequest(
+                basic_header(user.email, "pwd").replace(" ", padding, 1)))
+    return requests
+
+
+def run(auth: BasicAuth, requests: list) -> float:
+    """ Mean seconds per current_user call
+    """
+    start = time.perf_counter()
+    for request in requests:
+        assert auth.current_user(request) is not None
+    return (time.perf_counter() - start) / len(requests)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    users = populate(1000, "pwd")
+    print("{:>8} {:>10} {:>10} {:>8}".format(
+        "hit rate", "uncached", "cached", "measured"))
+    for hit_rate in (0.0, 0.5, 0.9, 0.99):
+        random.seed(0)
+        requests = build_requests(users, count, hit_rate)
+        os.environ['BASIC_AUTH_CACHE_TTL'] = '0'
+        uncached = run(BasicAuth(), requests)
+        os.environ['BASIC_AUTH_CACHE_TTL'] = '300'
+        auth = BasicAuth()
+        cached = run(auth, requests)
+        print("{:>7.0%} {:>8.2f}us {:>8.2f}us {:>7.1%}".format(
+            hit_rate, uncached * 1e6, cached * 1e6,
+            auth.credential_cache.stats()['hit_rate']))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+""" Benchmark of Auth.require_auth with hundreds of excluded paths
+"""
+import sys
+import timeit
+from typing import List
+from api.v1.auth.auth import Auth, PathMatcher
+
+
+def require_auth_scan(path: str, excluded_paths: List[str]) -> bool:
+    """ Reference implementation walking every rule on every call
+    """
+    if path is None:
+        return True
+    elif excluded_paths is None or len(excluded_paths) == 0:
+        return True
+    elif path in excluded_paths:
+        return False
+    for excluded_path in excluded_paths:
+        if excluded_path.startswith(path):
+            return False
+        if path.startswith(excluded_path):
+            return False
+        if excluded_path[-1] == '*':
+            if path.startswith(excluded_path[:-1]):
+                return False
+    return True
+
+
+def build_rules(count: int) -> List[str]:
+    """ count exclusion rules mixing exact, prefix and wildcard ones
+    """
+    rules = []
+    for i in range(count):
+        if i % 3 == 0:
+            rules.append("/api/v1/public/service{}/".format(i))
+        elif i % 3 == 1:
+            rules.append("/api/v1/health/probe{}*".format(i))
+        else:
+            rules.append("/api/v2/docs/page{}".format(i))
+    return rules
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 500, 1000]
+    auth = Auth()
+    paths = ["/api/v1/users/me", "/api/v1/public/service0/info",
+             "/api/v1/health/probe1/live", "/api/v1/status/"]
+    print("{:>6} {:>10} {:>10}".format("rules", "scan", "trie"))
+    for size in sizes:
+        rules = build_rules(size)
+        matcher = PathMatcher(rules)
+        for path in paths:
+            assert auth.require_auth(path, matcher) == \
+                require_auth_scan(path, rules)
+        number = 20000
+        scan = timeit.timeit(
+            lambda: [require_auth_scan(p, rules) for p in paths],
+            number=number)
+        trie = timeit.timeit(
+            lambda: [auth.require_auth(p, matcher) for p in paths],
+            number=number)
+        calls = number * len(paths)
+        print("{:>6} {:>8.2f}us {:>8.2f}us".format(
+            size, scan / calls * 1e6, trie / calls * 1e6))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+""" Benchmark of User.search by email, with and without the email index
+"""
+import sys
+import timeit
+from models.base import DATA
+from models.user import User
+
+
+def populate(count: int, password: str = None) -> list:
+    """ Fill the in-memory store with count users, without touching disk,
+    and return them
+    """
+    User._reset_indexes()
+    DATA['User'] = {}
+    users = []
+    for i in range(count):
+        user = User(email="user{}@example.com".format(i))
+        if password is not None:
+            user.password = password
+        DATA['User'][user.id] = user
+        user._index()
+        users.append(user)
+    return users
+
+
+def lookup_us(email: str, number: int) -> float:
+    """ Average User.search latency for one email in microseconds
+    """
+    seconds = timeit.timeit(lambda: User.search({'email': email}),
+                            number=number)
+    return seconds / number * 1e6
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 100000, 1000000]
+    print("{:>9} {:>12} {:>12}".format("users", "indexed", "full scan"))
+    for size in sizes:
+        populate(size)
+        email = "user{}@example.com".format(size // 2)
+        indexed = lookup_us(email, 1000)
+        indexes, User.indexes = User.indexes, {}
+        scan = lookup_us(email, max(1, 100000 // size))
+        User.indexes = indexes
+        print("{:>9} {:>10.1f}us {:>10.1f}us".format(size, indexed, scan))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+""" Check that switching DB_SNAPSHOT_FORMAT, in either direction, keeps
+every write: each step runs in a new process, as after a restart
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SNAPSHOT_FORMATS = ('json', 'columnar')
+
+
+def step(count: int):
+    """ Load the store, add count users, remove one, snapshot, then add
+    a few journal-only users; print the emails left
+    """
+    from models.user import User
+    User.load_from_file()
+    with User.unit_of_work():
+        for i in range(count):
+            user = User(email="user{}-{}@example.com".format(
+                User.count(), i))
+            user.save()
+    min(User.all(), key=lambda user: user.email).remove()
+    User.save_to_file()
+    for i in range(5):
+        User(email="journal{}-{}@example.com".format(
+            User.count(), i)).save()
+    print(json.dumps(sorted(user.email for user in User.all())))
+
+
+def emails():
+    """ Print the emails of the loaded store
+    """
+    from models.user import User
+    User.load_from_file()
+    print(json.dumps(sorted(user.email for user in User.all())))
+
+
+def run(directory: str, snapshot_format: str, *args: str) -> list:
+    """ Run this script with args in directory and return its output
+    """
+    env = dict(os.environ, DB_SNAPSHOT_FORMAT=snapshot_format,
+               PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__)] + list(args),
+        cwd=directory, env=env, check=True, capture_output=True).stdout
+    return json.loads(output)
+
+
+def check(first: str, second: str) -> bool:
+    """ Write in first, then in second, then load in both formats
+    """
+    directory = tempfile.mkdtemp()
+    run(directory, first, 'step', '2500')
+    expected = run(directory, second, 'step', '10')
+    ok = True
+    for snapshot_format in (first, second):
+        found = run(directory, snapshot_format, 'emails')
+        if found != expected:
+            ok = False
+            print("{} -> {}, loaded as {}: {} users instead of {}".format(
+                first, second, snapshot_format, len(found), len(expected)))
+    return ok
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['step']:
+        step(int(sys.argv[2]))
+    elif sys.argv[1:2] == ['emails']:
+        emails()
+    else:
+        ok = all([check(first, second) for first in SNAPSHOT_FORMATS
+                  for second in SNAPSHOT_FORMATS if first != second])
+        print("ok" if ok else "FAILED")
+        sys.exit(0 if ok else 1)
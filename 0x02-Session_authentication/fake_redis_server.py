@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+""" Minimal in-memory Redis-protocol server for local runs and tests of
+    the redis session backend. Supports PING, SELECT, GET, SET [EX],
+    MGET, DEL, EXPIRE, TTL, SCAN, DBSIZE, FLUSHDB, and ZADD, ZREM, ZCARD
+    and ZREMRANGEBYSCORE on sorted sets
+"""
+import fnmatch
+import socketserver
+import sys
+import threading
+import time
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """ One client connection
+    """
+
+    def read_command(self):
+        """ Read one RESP array of bulk strings, None on disconnect
+        """
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def reply(self, value):
+        """ Encode a Python value as a RESP reply
+        """
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, Exception):
+            return "-ERR {}\r\n".format(value).encode()
+        if isinstance(value, bool):
+            return b"+OK\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + \
+                b"".join(self.reply(v) for v in value)
+        data = str(value).encode()
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    def handle(self):
+        """ Serve commands until the client disconnects
+        """
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            try:
+                result = self.server.dispatch(args)
+            except Exception as e:
+                result = e
+            self.wfile.write(self.reply(result))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """ Threaded TCP server holding one key-value dictionary
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        """ Bind to address; port 0 picks a free port
+        """
+        super().__init__(address, FakeRedisHandler)
+        self.lock = threading.Lock()
+        self.data = {}
+        self.expires = {}
+        # key -> {member: score} of the sorted sets
+        self.zsets = {}
+
+    @property
+    def url(self) -> str:
+        """ redis:// URL of the server
+        """
+        host, port = self.server_address
+        return "redis://{}:{}/0".format(host, port)
+
+    def _live(self, key: str) -> bool:
+        """ Drop key if expired, return True if it still exists
+        """
+        if key in self.expires and self.expires[key] <= time.time():
+            del self.expires[key]
+            del self.data[key]
+        return key in self.data
+
+    def dispatch(self, args: list):
+        """ Execute one command
+        """
+        name = args[0].upper()
+        with self.lock:
+            if name == 'PING':
+                return True
+            if name in ('SELECT', 'FLUSHDB'):
+                if name == 'FLUSHDB':
+                    self.data.clear()
+                    self.expires.clear()
+                    self.zsets.clear()
+                return True
+            if name == 'GET':
+                return self.data[args[1]] if self._live(args[1]) else None
+            if name == 'MGET':
+                return [self.data[k] if self._live(k) else None
+                        for k in args[1:]]
+            if name == 'SET':
+                self.data[args[1]] = args[2]
+                self.expires.pop(args[1], None)
+                if len(args) == 5 and args[3].upper() == 'EX':
+                    self.expires[args[1]] = time.time() + int(args[4])
+                return True
+            if name == 'DEL':
+                removed = 0
+                for key in args[1:]:
+                    if self._live(key):
+                        del self.data[key]
+                        self.expires.pop(key, None)
+                        removed += 1
+                return removed
+            if name == 'EXPIRE':
+                if not self._live(args[1]):
+                    return 0
+                self.expires[args[1]] = time.time() + int(args[2])
+                return 1
+            if name == 'TTL':
+                if not self._live(args[1]):
+                    return -2
+                if args[1] not in self.expires:
+                    return -1
+                return int(self.expires[args[1]] - time.time())
+            if name == 'SCAN':
+                pattern = '*'
+                if 'MATCH' in [a.upper() for a in args]:
+                    pattern = args[[a.upper() for a in args].index(
+                        'MATCH') + 1]
+                keys = [k for k in list(self.data)
+                        if self._live(k) and fnmatch.fnmatchcase(k, pattern)]
+                return ['0', keys]
+            if name == 'DBSIZE':
+                return sum(1 for k in list(self.data) if self._live(k)) + \
+                    len(self.zsets)
+            if name == 'ZADD':
+                zset = self.zsets.setdefault(args[1], {})
+                added = 0
+                for score, member in zip(args[2::2], args[3::2]):
+                    added += member not in zset
+                    zset[member] = float(score)
+                return added
+            if name == 'ZREM':
+                zset = self.zsets.get(args[1], {})
+                removed = sum(zset.pop(m, None) is not None
+                              for m in args[2:])
+                if not zset:
+                    self.zsets.pop(args[1], None)
+                return removed
+            if name == 'ZCARD':
+                return len(self.zsets.get(args[1], {}))
+            if name == 'ZREMRANGEBYSCORE':
+                zset = self.zsets.get(args[1], {})
+                low, high = float(args[2]), float(args[3])
+                stale = [m for m, s in zset.items() if low <= s <= high]
+                for member in stale:
+                    del zset[member]
+                return len(stale)
+        raise ValueError("unknown command '{}'".format(args[0]))
+
+
+def start_fake_redis(address=('127.0.0.1', 0)) -> FakeRedisServer:
+    """ Start a FakeRedisServer in a background thread
+    """
+    server = FakeRedisServer(address)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+    server = FakeRedisServer(('127.0.0.1', port))
+    print("fake redis listening on {}".format(server.url))
+    server.serve_forever()
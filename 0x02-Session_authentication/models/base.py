@@ -1,39 +1,94 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator, Dict, Tuple
+from os import getenv, path
+from models import metrics
+from models.journal import Journal
+from models.snapshot import ColumnStore, dump_columns, encode_row, \
+    from_epoch, load_columns, to_epoch
+import bisect
 import json
+import os
+import threading
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+# Snapshot file format written by save_to_file: 'json' or 'columnar'
+SNAPSHOT_FORMAT = getenv('DB_SNAPSHOT_FORMAT', 'json')
+SNAPSHOT_EXTENSIONS = {'json': 'json', 'columnar': 'col'}
 DATA = {}
+# Journal records after which a background snapshot is taken, or the
+# store size once it is larger
+COMPACTION_THRESHOLD = 1000
+# Guards DATA mutations against journal rotation, and reads against
+# half-done reloads
+LOCK = threading.RLock()
+# Serializes snapshot writes of the same store
+SNAPSHOT_LOCK = threading.Lock()
+# JOURNALS[s_class] -> Journal of the class
+JOURNALS = {}
+# JOURNAL_RECORDS[s_class] -> records appended since the last snapshot
+JOURNAL_RECORDS = {}
+COMPACTING = set()
+# Per-thread records deferred by Base.unit_of_work
+UNIT_OF_WORK = threading.local()
+# FILE_STATE[s_class] -> on-disk state seen by the last (re)load
+FILE_STATE = {}
+# INDEXES[s_class][attribute][value] -> {obj_id: None}, ordered id set
+INDEXES = {}
+# INDEXED_VALUES[s_class][obj_id] -> {attribute: value} at last indexing
+INDEXED_VALUES = {}
+# ORDER[s_class] -> sorted [(created_at epoch seconds, obj_id)], the page
+# order; ORDER_KEYS[s_class][obj_id] -> the key of the object in ORDER
+ORDER = {}
+ORDER_KEYS = {}
+# Ordered index entries read by Base.page per LOCK acquisition
+PAGE_SCAN = 500
+metrics.describe('model_saves_total', "Objects saved, by model")
+metrics.describe('model_removes_total', "Objects removed, by model")
+
+
+class VersionConflict(Exception):
+    """ Raised by Base.save when the stored object changed since the
+    expected version
+    """
 
 
 class Base():
     """ Base class
     """
 
+    # Secondary indexes: attribute name -> True if the index is unique
+    indexes: Dict[str, bool] = {}
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
             DATA[s_class] = {}
+            self.__class__._reset_indexes()
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
-        if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
-        else:
-            self.created_at = datetime.utcnow()
-        if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
-        else:
-            self.updated_at = datetime.utcnow()
+        self.created_at = self._timestamp(kwargs.get('created_at'))
+        self.updated_at = self._timestamp(kwargs.get('updated_at'))
+        # Bumped by every save
+        self._version = kwargs.get('_version', 0)
+
+    @staticmethod
+    def _timestamp(value) -> datetime:
+        """ Parse a serialized timestamp: formatted string from a JSON
+        snapshot, epoch seconds from a columnar one, or now if missing
+        """
+        if value is None:
+            return datetime.utcnow()
+        if type(value) is int:
+            return from_epoch(value)
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
@@ -44,6 +99,12 @@ class Base():
             return False
         return (self.id == other.id)
 
+    @property
+    def etag(self) -> str:
+        """ Strong entity tag of the current state of the object
+        """
+        return "{}-{}".format(self._version, to_epoch(self.updated_at))
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
@@ -58,55 +119,439 @@ class Base():
         return result
 
     @classmethod
-    def load_from_file(cls):
-        """ Load all objects from file
+    def _reset_indexes(cls):
+        """ Drop every secondary index entry of the class
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls.indexes}
+        INDEXED_VALUES[s_class] = {}
+        ORDER[s_class] = []
+        ORDER_KEYS[s_class] = {}
+
+    @staticmethod
+    def _order_key(created_at, obj_id: str) -> tuple:
+        """ Key of an object in the ordered index: created_at is rounded
+        down to the second, as in snapshots, so it survives a reload
+        """
+        if type(created_at) is datetime:
+            created_at = to_epoch(created_at)
+        return (created_at, obj_id)
+
+    def _unorder(self):
+        """ Remove the current object from the ordered index
+        """
+        s_class = self.__class__.__name__
+        key = ORDER_KEYS[s_class].pop(self.id, None)
+        if key is not None:
+            keys = ORDER[s_class]
+            del keys[bisect.bisect_left(keys, key)]
+
+    def _unindex(self, order: bool = True):
+        """ Remove the current object from the secondary indexes and, if
+        order, from the ordered index
+        """
+        s_class = self.__class__.__name__
+        if order:
+            self._unorder()
+        values = INDEXED_VALUES[s_class].pop(self.id, {})
+        for attr, value in values.items():
+            bucket = INDEXES[s_class][attr].get(value)
+            if bucket is None:
+                continue
+            bucket.pop(self.id, None)
+            if len(bucket) == 0:
+                del INDEXES[s_class][attr][value]
+
+    def _index(self):
+        """ Add the current object to the secondary and ordered indexes
+        """
+        s_class = self.__class__.__name__
+        # Every unique value is checked before any index changes, so a
+        # conflict leaves the entries of the object as they were
+        values = {}
+        for attr, unique in self.indexes.items():
+            value = getattr(self, attr, None)
+            try:
+                bucket = INDEXES[s_class][attr].get(value, {})
+            except TypeError:
+                # Unhashable values are left to the full scan
+                continue
+            if unique and any(obj_id != self.id for obj_id in bucket):
+                raise ValueError("{}.{} must be unique: {}".format(
+                    s_class, attr, value))
+            values[attr] = value
+        self._unindex(order=False)
+        for attr, value in values.items():
+            INDEXES[s_class][attr].setdefault(value, {})[self.id] = None
+        INDEXED_VALUES[s_class][self.id] = values
+        key = self._order_key(self.created_at, self.id)
+        if ORDER_KEYS[s_class].get(self.id) != key:
+            self._unorder()
+            # Mostly an append: objects are saved in creation order
+            bisect.insort(ORDER[s_class], key)
+            ORDER_KEYS[s_class][self.id] = key
+
+    @classmethod
+    def _journal(cls) -> Journal:
+        """ Return the journal of the class
+        """
+        s_class = cls.__name__
+        with LOCK:
+            if JOURNALS.get(s_class) is None:
+                JOURNALS[s_class] = Journal(".db_{}.journal".format(s_class))
+            return JOURNALS[s_class]
+
+    @classmethod
+    def _append_journal(cls, records: List[dict]) -> int:
+        """ Queue save/remove records on the journal and start a background
+        snapshot once the journal grows past the threshold. Must be called
+        with LOCK held; returns the sequence number to wait for
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        seq = cls._journal().append(records)
+        JOURNAL_RECORDS[s_class] = \
+            JOURNAL_RECORDS.get(s_class, 0) + len(records)
+        # Growing with the store keeps the snapshot rewrites amortized O(1)
+        # per record, even for bulk loads
+        threshold = max(COMPACTION_THRESHOLD, len(DATA[s_class]))
+        if JOURNAL_RECORDS[s_class] >= threshold and \
+                s_class not in COMPACTING:
+            COMPACTING.add(s_class)
+            threading.Thread(target=cls._compact, daemon=True).start()
+        return seq
+
+    @classmethod
+    def _commit(cls, record: dict):
+        """ Journal one record, or defer it inside a unit of work. Must be
+        called with LOCK held; returns the sequence to wait for, if any
+        """
+        deferred = getattr(UNIT_OF_WORK, 'records', None)
+        if deferred is not None:
+            deferred.append((cls, record))
+            return None
+        return cls._append_journal([record])
+
+    @classmethod
+    @contextmanager
+    def unit_of_work(cls):
+        """ Defer the journal writes of every save() and remove() made by
+        the current thread inside the block, then commit them as one
+        group write on exit
+        """
+        if getattr(UNIT_OF_WORK, 'records', None) is not None:
+            yield
             return
+        UNIT_OF_WORK.records = []
+        try:
+            yield
+        finally:
+            deferred, UNIT_OF_WORK.records = UNIT_OF_WORK.records, None
+            by_class = {}
+            for klass, record in deferred:
+                by_class.setdefault(klass, []).append(record)
+            with LOCK:
+                seqs = [(klass, klass._append_journal(records))
+                        for klass, records in by_class.items()]
+            for klass, seq in seqs:
+                klass._journal().wait(seq)
+
+    @classmethod
+    def _compact(cls):
+        """ Background snapshot of the class store
+        """
+        try:
+            cls.save_to_file()
+        finally:
+            COMPACTING.discard(cls.__name__)
+
+    @classmethod
+    def _replay_journal(cls, f, skip_writer: str = None) -> int:
+        """ Apply the complete records read from the binary journal file f
+        to DATA, skipping those of skip_writer, and return their count.
+        f is left after the last complete record
+        """
+        s_class = cls.__name__
+        count = 0
+        offset = f.tell()
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Still being written by another process
+                break
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn write from a crash
+                continue
+            if skip_writer is not None and \
+                    record.get('writer') == skip_writer:
+                continue
+            if record.get('op') == 'remove':
+                obj = DATA[s_class].pop(record['id'], None)
+                if obj is not None:
+                    obj._unindex()
+            else:
+                obj = cls(**record['obj'])
+                obj._index()
+                DATA[s_class][obj.id] = obj
+            count += 1
+        f.seek(offset)
+        return count
+
+    @classmethod
+    def _snapshot_path(cls, snapshot_format: str) -> str:
+        """ Path of the snapshot file of the class in the given format
+        """
+        return ".db_{}.{}".format(cls.__name__,
+                                  SNAPSHOT_EXTENSIONS[snapshot_format])
+
+    @classmethod
+    def _load_columns(cls, file_path: str):
+        """ Load a columnar snapshot: objects are materialized lazily and
+        the indexes are built straight from the columns
+        """
+        s_class = cls.__name__
+        with open(file_path, 'rb') as f:
+            store = ColumnStore(cls, load_columns(f))
+        DATA[s_class] = store
+        values = INDEXED_VALUES[s_class]
+        for attr in cls.indexes:
+            index = INDEXES[s_class][attr]
+            for obj_id, value in store.column(attr):
+                index.setdefault(value, {})[obj_id] = None
+                values.setdefault(obj_id, {})[attr] = value
+        keys = ORDER_KEYS[s_class]
+        for obj_id, created_at in store.column('created_at'):
+            keys[obj_id] = cls._order_key(created_at, obj_id)
+        ORDER[s_class] = sorted(keys.values())
 
+    @classmethod
+    def _load_json(cls, file_path: str):
+        """ Load a JSON snapshot
+        """
+        s_class = cls.__name__
         with open(file_path, 'r') as f:
             objs_json = json.load(f)
             for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+                obj = cls(**obj_json)
+                obj._index()
+                DATA[s_class][obj_id] = obj
+
+    @staticmethod
+    def _file_signature(file_path: str):
+        """ (inode, mtime, size) of a file, None if it does not exist
+        """
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    @classmethod
+    def _current_snapshot(cls):
+        """ Format and path of the snapshot to load: the most recently
+        written one, whatever its format, SNAPSHOT_FORMAT on a tie.
+        (None, None) when there is no snapshot
+        """
+        found = []
+        for snapshot_format in SNAPSHOT_EXTENSIONS:
+            file_path = cls._snapshot_path(snapshot_format)
+            try:
+                mtime = os.stat(file_path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            found.append((mtime, snapshot_format == SNAPSHOT_FORMAT,
+                          snapshot_format, file_path))
+        if not found:
+            return None, None
+        _, _, snapshot_format, file_path = max(found)
+        return snapshot_format, file_path
+
+    @classmethod
+    def load_from_file(cls):
+        """ Load all objects from the snapshot file, then replay the journal
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        journal = cls._journal()
+        # Shared: no other process can rotate or compact meanwhile
+        with journal.shared(), LOCK:
+            journal.flush()
+            DATA[s_class] = {}
+            cls._reset_indexes()
+            snapshot_format, file_path = cls._current_snapshot()
+            snapshot = None
+            if snapshot_format == 'columnar':
+                snapshot = cls._file_signature(file_path)
+                cls._load_columns(file_path)
+            elif snapshot_format == 'json':
+                snapshot = cls._file_signature(file_path)
+                cls._load_json(file_path)
+
+            # A journal rotated by an interrupted snapshot comes first
+            count = 0
+            if path.exists(journal_path + ".old"):
+                with open(journal_path + ".old", 'rb') as f:
+                    count += cls._replay_journal(f)
+            journal_state = None
+            if path.exists(journal_path):
+                with open(journal_path, 'rb') as f:
+                    count += cls._replay_journal(f)
+                    journal_state = (os.fstat(f.fileno()).st_ino, f.tell())
+            JOURNAL_RECORDS[s_class] = count
+            FILE_STATE[s_class] = {'snapshot': snapshot,
+                                   'journal': journal_state}
+
+    @classmethod
+    def refresh_from_file(cls):
+        """ Bring the store up to date with changes made by other processes
+
+        Costs a few stat calls when nothing changed. New journal records
+        are replayed from the last offset seen, skipping the records of
+        this process; a new snapshot or journal file means a full reload.
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        state = FILE_STATE.get(s_class)
+        if state is None or DATA.get(s_class) is None:
+            return cls.load_from_file()
+        _, file_path = cls._current_snapshot()
+        snapshot = cls._file_signature(file_path) if file_path else None
+        if snapshot != state['snapshot']:
+            return cls.load_from_file()
+        try:
+            f = open(journal_path, 'rb')
+        except FileNotFoundError:
+            if state['journal'] is not None:
+                cls.load_from_file()
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if state['journal'] is None or state['journal'][0] != st.st_ino:
+                return cls.load_from_file()
+            if st.st_size == state['journal'][1]:
+                return
+            with LOCK:
+                f.seek(state['journal'][1])
+                cls._replay_journal(f, cls._journal().writer)
+                state['journal'] = (st.st_ino, f.tell())
 
     @classmethod
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Save all objects to the snapshot file and truncate the journal
+
+        The journal is rotated under LOCK together with the in-memory copy,
+        so writers only wait for that copy, not for the file write. The
+        snapshot is written to a temporary file and atomically renamed.
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        file_path = cls._snapshot_path(SNAPSHOT_FORMAT)
+        journal_path = ".db_{}.journal".format(s_class)
+        journal = cls._journal()
+        with SNAPSHOT_LOCK, journal.exclusive():
+            # Catch up with the other processes before snapshotting
+            cls.refresh_from_file()
+            with LOCK:
+                store = DATA[s_class]
+                if SNAPSHOT_FORMAT == 'columnar':
+                    if isinstance(store, ColumnStore):
+                        rows = list(store.rows())
+                    else:
+                        rows = [(obj_id, encode_row(obj))
+                                for obj_id, obj in store.items()]
+                else:
+                    objs_json = {}
+                    for obj_id, obj in store.items():
+                        objs_json[obj_id] = obj.to_json(True)
+                journal.rotate(journal_path + ".old")
+                JOURNAL_RECORDS[s_class] = 0
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+            tmp_path = file_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                if SNAPSHOT_FORMAT == 'columnar':
+                    dump_columns(rows, f)
+                else:
+                    f.write(json.dumps(objs_json).encode())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+            # The journal no longer holds what a snapshot in another
+            # format misses: it must never be loaded again
+            for snapshot_format in SNAPSHOT_EXTENSIONS:
+                other_path = cls._snapshot_path(snapshot_format)
+                if other_path != file_path and path.exists(other_path):
+                    os.remove(other_path)
+            if path.exists(journal_path + ".old"):
+                os.remove(journal_path + ".old")
+            # Nobody could append meanwhile: the new journal is empty
+            FILE_STATE[s_class] = {
+                'snapshot': cls._file_signature(file_path),
+                'journal': (os.stat(journal_path).st_ino, 0)}
 
-    def save(self):
+    def save(self, if_version: int = None):
         """ Save current object
+
+        With if_version, the save only happens if the stored object is
+        still at that version, else VersionConflict is raised
         """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with LOCK:
+            stored = DATA[s_class].get(self.id)
+            if if_version is not None and \
+                    (stored is None or stored._version != if_version):
+                raise VersionConflict("{} {} is not at version {}".format(
+                    s_class, self.id, if_version))
+            self.updated_at = datetime.utcnow()
+            self._index()
+            version = self._version
+            if stored is not None:
+                version = max(version, stored._version)
+            self._version = version + 1
+            DATA[s_class][self.id] = self
+            seq = self.__class__._commit(
+                {'op': 'save', 'id': self.id, 'obj': self.to_json(True)})
+        metrics.inc('model_saves_total', model=s_class)
+        if seq is not None:
+            self.__class__._journal().wait(seq)
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        seq = None
+        with LOCK:
+            if DATA[s_class].get(self.id) is not None:
+                del DATA[s_class][self.id]
+                self._unindex()
+                seq = self.__class__._commit({'op': 'remove', 'id': self.id})
+                metrics.inc('model_removes_total', model=s_class)
+        if seq is not None:
+            self.__class__._journal().wait(seq)
+
+    @classmethod
+    def counts(cls) -> Dict[str, int]:
+        """ Number of objects of each loaded model class, read without
+        LOCK: cheap enough for monitoring, maybe stale during a reload
+        """
+        return {s_class: len(objs) for s_class, objs in list(DATA.items())}
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        with LOCK:
+            return len(DATA[s_class].keys())
+
+    @classmethod
+    def count_since(cls, when: datetime) -> int:
+        """ Count the objects created at or after when, to the second,
+        by bisecting the ordered index
+        """
+        s_class = cls.__name__
+        with LOCK:
+            keys = ORDER[s_class]
+            return len(keys) - bisect.bisect_left(keys, (to_epoch(when),))
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -114,18 +559,49 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def iter_all(cls) -> Iterator[TypeVar('Base')]:
+        """ Yield all objects one by one, without building their list:
+        only the IDs are copied, objects removed meanwhile are skipped
+        """
+        s_class = cls.__name__
+        with LOCK:
+            obj_ids = list(DATA[s_class].keys())
+        for obj_id in obj_ids:
+            obj = cls.get(obj_id)
+            if obj is not None:
+                yield obj
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        with LOCK:
+            return DATA[s_class].get(id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        Equality on an indexed attribute only scans that index bucket;
+        other searches scan every object.
         """
         s_class = cls.__name__
+        # Only collecting the candidates needs LOCK, not the filtering
+        with LOCK:
+            objs = None
+            for attr in attributes:
+                if attr not in cls.indexes:
+                    continue
+                try:
+                    bucket = INDEXES[s_class][attr].get(attributes[attr], {})
+                except TypeError:
+                    continue
+                objs = [DATA[s_class][obj_id] for obj_id in bucket]
+                break
+            if objs is None:
+                objs = list(DATA[s_class].values())
 
         def _search(obj):
             if len(attributes) == 0:
@@ -135,4 +611,50 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        return list(filter(_search, objs))
+
+    @classmethod
+    def page(cls, attributes: dict = {}, after: tuple = None,
+             limit: int = 100) -> Tuple[List[TypeVar('Base')], tuple]:
+        """ Up to limit objects with matching attributes, in the order of
+        (created_at, id), starting after the ordered index key after
+
+        Each step bisects the ordered index, or, when an attribute is
+        indexed, the keys of its index bucket, sorted once per call, so a
+        page costs the same wherever it starts. Returns the objects and
+        the key to pass as after for the next page, None on the last page.
+        """
+        s_class = cls.__name__
+        indexed = [attr for attr in attributes if attr in cls.indexes]
+        bucket_keys = None
+        if indexed:
+            # Sorted once per call; objects removed or changed since are
+            # skipped by the checks below
+            with LOCK:
+                try:
+                    bucket = INDEXES[s_class][indexed[0]].get(
+                        attributes[indexed[0]], {})
+                except TypeError:
+                    bucket = {}
+                bucket_keys = sorted(ORDER_KEYS[s_class][obj_id]
+                                     for obj_id in bucket)
+        objs = []
+        while len(objs) < limit:
+            with LOCK:
+                keys = ORDER[s_class] if bucket_keys is None else bucket_keys
+                start = 0 if after is None else \
+                    bisect.bisect_right(keys, after)
+                chunk = keys[start:start + max(limit, PAGE_SCAN)]
+                more = start + len(chunk) < len(keys)
+                chunk_objs = [DATA[s_class].get(key[1]) for key in chunk]
+            for key, obj in zip(chunk, chunk_objs):
+                if obj is not None and all(getattr(obj, k, None) == v
+                                           for k, v in attributes.items()):
+                    objs.append(obj)
+                after = key
+                if len(objs) == limit:
+                    more = more or key != chunk[-1]
+                    break
+            if not more:
+                return objs, None
+        return objs, after
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+""" Journal module
+"""
+from contextlib import contextmanager
+from os import getenv, path
+from typing import List
+import atexit
+import fcntl
+import json
+import os
+import threading
+import uuid
+
+
+# fsync every commit, fsync every flush interval, or never fsync
+DURABILITY_COMMIT = 'commit'
+DURABILITY_INTERVAL = 'interval'
+DURABILITY_NONE = 'none'
+DURABILITY = getenv('DB_DURABILITY', DURABILITY_COMMIT)
+# Upper bounds on how long / how many records a flush may wait for
+FLUSH_INTERVAL = float(getenv('DB_FLUSH_INTERVAL', '1.0'))
+FLUSH_SIZE = int(getenv('DB_FLUSH_SIZE', '1000'))
+
+
+class Journal():
+    """ Append-only journal file with group commit
+
+    Records are queued in memory and written by one flusher thread, so
+    concurrent commits share a single write and fsync.
+
+    Several processes may share the journal: appends hold a shared flock
+    on the .lock file and rotation holds it exclusively, and every write
+    reopens the journal if another process rotated it away.
+    """
+
+    def __init__(self, file_path: str, durability: str = None,
+                 interval: float = None, max_batch: int = None):
+        """ Initialize a Journal and start its flusher thread
+        """
+        self.file_path = file_path
+        self.durability = durability or DURABILITY
+        self.interval = FLUSH_INTERVAL if interval is None else interval
+        self.max_batch = max_batch or FLUSH_SIZE
+        # Tags the records of this journal so their replay can be skipped
+        self.writer = uuid.uuid4().hex
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._exclusive_lock = threading.RLock()
+        self._exclusive_owner = None
+        self._exclusive_depth = 0
+        self._shared_mutex = threading.Lock()
+        self._shared_count = 0
+        lock_path = file_path + ".lock"
+        # Two open file descriptions: flocks on them conflict in-process
+        self._shared_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT)
+        self._exclusive_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT)
+        self._pending = []
+        self._appended = 0
+        self._durable = 0
+        self._closed = False
+        self._file = self._open()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _open(self):
+        """ Open the journal file for appending
+        """
+        f = open(self.file_path, 'a+')
+        # Never append after a record torn by a crash
+        if f.tell() > 0:
+            f.seek(f.tell() - 1)
+            if f.read(1) != "\n":
+                f.write("\n")
+        return f
+
+    @contextmanager
+    def exclusive(self):
+        """ Hold the journal exclusively: no process can append meanwhile
+        """
+        with self._exclusive_lock:
+            if self._exclusive_depth == 0:
+                fcntl.flock(self._exclusive_fd, fcntl.LOCK_EX)
+                self._exclusive_owner = threading.get_ident()
+            self._exclusive_depth += 1
+            try:
+                yield
+            finally:
+                self._exclusive_depth -= 1
+                if self._exclusive_depth == 0:
+                    self._exclusive_owner = None
+                    fcntl.flock(self._exclusive_fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def shared(self):
+        """ Hold the journal shared, unless this thread holds it exclusively.
+        Threads share one flock, released by the last of them
+        """
+        if self._exclusive_owner == threading.get_ident():
+            yield
+            return
+        with self._shared_mutex:
+            if self._shared_count == 0:
+                fcntl.flock(self._shared_fd, fcntl.LOCK_SH)
+            self._shared_count += 1
+        try:
+            yield
+        finally:
+            with self._shared_mutex:
+                self._shared_count -= 1
+                if self._shared_count == 0:
+                    fcntl.flock(self._shared_fd, fcntl.LOCK_UN)
+
+    def append(self, records: List[dict]) -> int:
+        """ Queue records and return the sequence number to wait for
+        """
+        with self._cond:
+            if self._closed:
+                raise ValueError("journal {} is closed".format(
+                    self.file_path))
+            for record in records:
+                record['writer'] = self.writer
+                self._pending.append(json.dumps(record))
+            self._appended += len(records)
+            self._cond.notify_all()
+            return self._appended
+
+    def wait(self, seq: int):
+        """ Block until the record numbered seq is durable, when the
+        durability level asks for it
+        """
+        if self.durability != DURABILITY_COMMIT:
+            return
+        with self._cond:
+            self._cond.wait_for(lambda: self._durable >= seq)
+
+    def _write(self, lines: List[str]):
+        """ Write lines and sync them according to the durability level.
+        Must be called holding the journal shared or exclusively
+        """
+        try:
+            rotated = os.stat(self.file_path).st_ino != \
+                os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            self._file.close()
+            self._file = self._open()
+        self._file.write("".join(line + "\n" for line in lines))
+        self._file.flush()
+        if self.durability != DURABILITY_NONE:
+            os.fsync(self._file.fileno())
+
+    def flush(self):
+        """ Synchronously write every queued record
+        """
+        with self.shared(), self._write_lock:
+            with self._cond:
+                lines, self._pending = self._pending, []
+                seq = self._appended
+            if lines:
+                self._write(lines)
+            with self._cond:
+                self._durable = max(self._durable, seq)
+                self._cond.notify_all()
+
+    def _run(self):
+        """ Flusher loop: one write per batch of queued records
+        """
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+                if self.durability != DURABILITY_COMMIT:
+                    self._cond.wait_for(
+                        lambda: len(self._pending) >= self.max_batch or
+                        self._closed, timeout=self.interval)
+            self.flush()
+
+    def rotate(self, old_path: str):
+        """ Flush, then move the journal to old_path and start a new one
+        """
+        with self.exclusive():
+            self.flush()
+            with self._write_lock:
+                self._file.close()
+                if path.exists(self.file_path):
+                    os.replace(self.file_path, old_path)
+                self._file = self._open()
+
+    def close(self):
+        """ Flush queued records and stop the flusher thread
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+        self._file.close()
+        os.close(self._shared_fd)
+        os.close(self._exclusive_fd)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+""" Metrics module
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+import threading
+import time
+
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025,
+                   0.0005, 0.001, 0.0025, 0.005, 0.01, 0.1, 1.0)
+HELP = {}
+# Every thread counts into its own shard, so updates never take a lock:
+# readers sum the shards. SHARDS holds (thread, shard) pairs; the shards
+# of finished threads are folded into RETIRED
+SHARDS = []
+RETIRED = {}
+SHARDS_LOCK = threading.Lock()
+LOCAL = threading.local()
+
+
+def _fold():
+    """ Fold the shards of finished threads into RETIRED. Must be called
+    with SHARDS_LOCK held
+    """
+    live = []
+    for thread, shard in SHARDS:
+        if thread.is_alive():
+            live.append((thread, shard))
+            continue
+        for key, value in shard.items():
+            RETIRED[key] = RETIRED.get(key, 0) + value
+    SHARDS[:] = live
+
+
+def _shard() -> Dict[tuple, float]:
+    """ Counters of the current thread
+    """
+    shard = getattr(LOCAL, 'shard', None)
+    if shard is None:
+        shard = LOCAL.shard = {}
+        with SHARDS_LOCK:
+            # Thread-per-request servers would grow SHARDS forever
+            if len(SHARDS) >= 64:
+                _fold()
+            SHARDS.append((threading.current_thread(), shard))
+    return shard
+
+
+def describe(name: str, help_text: str, kind: str = 'counter'):
+    """ Register the Prometheus HELP text and TYPE of a metric
+    """
+    HELP[name] = (help_text, kind)
+
+
+def inc(name: str, value: float = 1, **labels):
+    """ Add value to a counter
+    """
+    key = (name, tuple(sorted(labels.items())))
+    shard = _shard()
+    shard[key] = shard.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    """ Record one value in a histogram with LATENCY_BUCKETS
+    """
+    labels = tuple(sorted(labels.items()))
+    shard = _shard()
+    bucket = (name + '_bucket', labels, bisect_left(LATENCY_BUCKETS, value))
+    shard[bucket] = shard.get(bucket, 0) + 1
+    key = (name + '_sum', labels)
+    shard[key] = shard.get(key, 0) + value
+    key = (name + '_count', labels)
+    shard[key] = shard.get(key, 0) + 1
+
+
+@contextmanager
+def timed(name: str, **labels):
+    """ Record the duration of the block in a histogram
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def collect() -> Dict[tuple, float]:
+    """ Sum of every shard: counter key -> value
+    """
+    with SHARDS_LOCK:
+        _fold()
+        totals = dict(RETIRED)
+        shards = [shard for _, shard in SHARDS]
+    for shard in shards:
+        # Copied first: the owner thread may add keys meanwhile
+        for key, value in list(shard.items()):
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def value(name: str, **labels) -> float:
+    """ Current value of one counter
+    """
+    return collect().get((name, tuple(sorted(labels.items()))), 0)
+
+
+def histogram(name: str, **labels) -> dict:
+    """ Count, sum and cumulative bucket counts of one histogram
+    """
+    totals = collect()
+    labels = tuple(sorted(labels.items()))
+    cumulative = 0
+    buckets = {}
+    for i, bound in enumerate(LATENCY_BUCKETS + (float('inf'),)):
+        cumulative += totals.get((name + '_bucket', labels, i), 0)
+        buckets[_bound(bound)] = cumulative
+    return {'count': totals.get((name + '_count', labels), 0),
+            'sum': totals.get((name + '_sum', labels), 0),
+            'buckets': buckets}
+
+
+def _bound(bound: float) -> str:
+    """ Prometheus le label of a bucket bound
+    """
+    return "+Inf" if bound == float('inf') else repr(bound)
+
+
+def _labels(labels: List[Tuple[str, object]]) -> str:
+    """ Prometheus label set
+    """
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(
+        k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in labels) + "}"
+
+
+def prometheus(gauges: Dict[tuple, float] = {}) -> str:
+    """ Every metric, plus the given gauges, in the Prometheus text
+    exposition format
+    """
+    totals = collect()
+    families = {}
+    for key, value in gauges.items():
+        families.setdefault(key[0], []).append((key[1], value))
+    for key, value in totals.items():
+        name, labels = key[0], key[1]
+        if name.endswith('_bucket'):
+            continue
+        families.setdefault(name, []).append((labels, value))
+    histograms = set(name for name, (_, kind) in HELP.items()
+                     if kind == 'histogram')
+    lines = []
+    for name in sorted(histograms):
+        help_text, kind = HELP[name]
+        lines.append("# HELP {} {}".format(name, help_text))
+        lines.append("# TYPE {} histogram".format(name))
+        label_sets = [labels for labels, _ in
+                      families.pop(name + '_count', [])]
+        for labels in sorted(label_sets):
+            cumulative = 0
+            for i, bound in enumerate(LATENCY_BUCKETS + (float('inf'),)):
+                cumulative += totals.get((name + '_bucket', labels, i), 0)
+                lines.append("{}_bucket{} {}".format(
+                    name, _labels(labels + (('le', _bound(bound)),)),
+                    cumulative))
+            lines.append("{}_sum{} {}".format(
+                name, _labels(labels),
+                totals.get((name + '_sum', labels), 0)))
+            lines.append("{}_count{} {}".format(
+                name, _labels(labels),
+                totals.get((name + '_count', labels), 0)))
+        families.pop(name + '_sum', None)
+    for name in sorted(families):
+        if name in HELP:
+            help_text, kind = HELP[name]
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, kind))
+        for labels, value in sorted(families[name]):
+            lines.append("{}{} {}".format(name, _labels(labels), value))
+    return "\n".join(lines) + "\n"
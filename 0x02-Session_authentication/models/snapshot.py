@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+""" Snapshot module
+"""
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Tuple
+import json
+import sys
+
+
+# Header of the file, then one JSON line describing the columns, then
+# the data of each column: raw int64 for arrays, JSON for lists. Nothing
+# in it can run code when loaded
+MAGIC = b"BCOL2\n"
+EPOCH = datetime(1970, 1, 1)
+# Columns stored as arrays of integer seconds since EPOCH
+TIMESTAMP_COLUMNS = ('created_at', 'updated_at')
+
+
+def to_epoch(value: datetime) -> int:
+    """ Convert a naive UTC datetime to whole seconds since EPOCH
+    """
+    return (value - EPOCH) // timedelta(seconds=1)
+
+
+def from_epoch(value: int) -> datetime:
+    """ Convert whole seconds since EPOCH to a naive UTC datetime
+    """
+    return EPOCH + timedelta(seconds=value)
+
+
+def encode_row(obj) -> dict:
+    """ Serialized attributes of an object, datetimes as epoch seconds
+    """
+    return {key: to_epoch(value) if type(value) is datetime else value
+            for key, value in obj.__dict__.items()}
+
+
+class ColumnStore(MutableMapping):
+    """ Mapping of object id to object backed by snapshot columns
+
+    Rows are only turned into objects the first time they are read, so
+    loading a snapshot costs one decode per column instead of one object
+    per row.
+    """
+
+    def __init__(self, cls: type, columns: dict):
+        """ Initialize a ColumnStore over the columns of cls objects
+        """
+        self._cls = cls
+        self._columns = columns
+        # id -> row number until materialized, then id -> object
+        self._items = dict(zip(columns.get('id', []),
+                               range(len(columns.get('id', [])))))
+
+    def row(self, i: int) -> dict:
+        """ Attributes of row i, timestamps as epoch seconds
+        """
+        return {name: column[i] for name, column in self._columns.items()}
+
+    def column(self, name: str) -> Iterator[Tuple[str, object]]:
+        """ (id, value) pairs of a column for rows not yet materialized
+        and attribute values of the materialized ones
+        """
+        values = self._columns.get(name)
+        for obj_id, item in self._items.items():
+            if type(item) is int:
+                yield obj_id, values[item] if values is not None else None
+            else:
+                yield obj_id, getattr(item, name, None)
+
+    def rows(self) -> Iterator[Tuple[str, dict]]:
+        """ (id, attributes) pairs of every object, without materializing
+        """
+        for obj_id, item in self._items.items():
+            if type(item) is int:
+                yield obj_id, self.row(item)
+            else:
+                yield obj_id, encode_row(item)
+
+    def __getitem__(self, obj_id: str):
+        """ Return the object, materializing it on first access
+        """
+        item = self._items[obj_id]
+        if type(item) is int:
+            item = self._cls(**self.row(item))
+            self._items[obj_id] = item
+        return item
+
+    def __setitem__(self, obj_id: str, obj):
+        """ Store an object
+        """
+        self._items[obj_id] = obj
+
+    def __delitem__(self, obj_id: str):
+        """ Drop an object
+        """
+        del self._items[obj_id]
+
+    def __iter__(self) -> Iterator[str]:
+        """ Iterate over object ids
+        """
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        """ Number of objects
+        """
+        return len(self._items)
+
+    def __contains__(self, obj_id) -> bool:
+        """ True if an object with this id is stored
+        """
+        return obj_id in self._items
+
+
+def dump_columns(rows: Iterable[Tuple[str, dict]], f):
+    """ Write (id, attributes) rows to f in the columnar snapshot format
+    """
+    rows = [row for _, row in rows]
+    names = {}
+    for row in rows:
+        names.update(dict.fromkeys(row))
+    columns = {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        if name in TIMESTAMP_COLUMNS and None not in values:
+            values = array('q', values)
+        columns[name] = values
+    header = []
+    payloads = []
+    for name, values in columns.items():
+        if type(values) is array:
+            payload = values.tobytes()
+            kind = 'int64'
+        else:
+            payload = json.dumps(values).encode()
+            kind = 'json'
+        header.append({'name': name, 'kind': kind, 'size': len(payload)})
+        payloads.append(payload)
+    f.write(MAGIC)
+    f.write(json.dumps({'byteorder': sys.byteorder,
+                        'columns': header}).encode() + b"\n")
+    for payload in payloads:
+        f.write(payload)
+
+
+def load_columns(f) -> dict:
+    """ Read the columns of a columnar snapshot file
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a columnar snapshot")
+    header = json.loads(f.readline())
+    columns = {}
+    for column in header['columns']:
+        payload = f.read(column['size'])
+        if len(payload) != column['size']:
+            raise ValueError("truncated columnar snapshot")
+        if column['kind'] == 'int64':
+            values = array('q')
+            values.frombytes(payload)
+            if header['byteorder'] != sys.byteorder:
+                values.byteswap()
+        elif column['kind'] == 'json':
+            values = json.loads(payload)
+        else:
+            raise ValueError("unknown column kind: {}".format(
+                column['kind']))
+        columns[column['name']] = values
+    return columns
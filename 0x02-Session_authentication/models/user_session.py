@@ -6,6 +6,8 @@ from models.base import Base
 class UserSession(Base):
     """UserSession model to store session information."""
 
+    indexes = {'session_id': True, 'user_id': False}
+
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a new UserSession instance."""
         super().__init__(*args, **kwargs)
@@ -5,9 +5,19 @@
 """
 from auth import Auth
 from flask import (Flask, jsonify, request, abort, redirect)
+from sweeper import SessionSweeper
 
 app = Flask(__name__)
 AUTH = Auth()
+SWEEPER = SessionSweeper(AUTH._db)
+if SWEEPER.interval > 0:
+    SWEEPER.start()
+
+
+@app.teardown_appcontext
+def close_session(exception=None) -> None:
+    """ Give the DB connection of the request back to the pool """
+    AUTH.close_session()
 
 
 @app.route('/', methods=['GET'])
@@ -47,7 +57,7 @@ def log_in() -> str:
     if not AUTH.valid_login(email, password):
         abort(401)
 
-    session_id = AUTH.create_session(email)
+    session_id = AUTH.create_session(email, request.user_agent.string)
 
     message = {"email": email, "message": "logged in"}
     response = jsonify(message)
@@ -72,11 +82,35 @@ def log_out() -> str:
     if user is None:
         abort(403)
 
-    AUTH.destroy_session(user.id)
+    AUTH.destroy_session(user.id, session_id)
 
     return redirect('/')
 
 
+@app.route('/sessions', methods=['GET'])
+def list_sessions() -> str:
+    """ This function returns the sessions of the user, one per device
+    """
+    session_id = request.cookies.get("session_id", None)
+
+    if session_id is None:
+        abort(403)
+
+    user = AUTH.get_user_from_session_id(session_id)
+
+    if user is None:
+        abort(403)
+
+    # Session IDs are credentials: only the current one is pointed out
+    sessions = [{"device": user_session.device,
+                 "created_at": user_session.created_at.isoformat(),
+                 "expires_at": user_session.expires_at.isoformat(),
+                 "current": user_session.id == session_id}
+                for user_session in AUTH.list_sessions(user.id)]
+
+    return jsonify(sessions), 200
+
+
 @app.route('/profile', methods=['GET'])
 def profile() -> str:
     """ This function returns the profile of the user """
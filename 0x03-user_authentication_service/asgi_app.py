@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+""" This module defines the ASGI flavour of app.py: the same routes on
+    Starlette, served by one uvicorn process. Requires starlette,
+    python-multipart, uvicorn and aiosqlite
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from async_auth import AsyncAuth
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse, Response
+from starlette.routing import Route
+from sweeper import SESSION_SWEEP_BATCH, SESSION_SWEEP_INTERVAL
+
+# Open connections served at once; uvicorn answers 503 beyond that
+ASGI_MAX_CONNECTIONS = int(os.getenv("ASGI_MAX_CONNECTIONS", "4096"))
+
+AUTH = AsyncAuth()
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    """ Prepare the database and run the session sweeper """
+    await AUTH.setup()
+    sweeper = None
+    if SESSION_SWEEP_INTERVAL > 0:
+        sweeper = asyncio.create_task(AUTH.sweep_sessions(
+            SESSION_SWEEP_INTERVAL, SESSION_SWEEP_BATCH))
+    try:
+        yield
+    finally:
+        if sweeper is not None:
+            sweeper.cancel()
+        await AUTH.close()
+
+
+async def _form(request: Request, *fields: str) -> list:
+    """ Values of the given form fields, or None for a missing one """
+    form = await request.form()
+    return [form.get(field) for field in fields]
+
+
+async def _current_user(request: Request):
+    """ User of the session cookie, aborting with 403 without one """
+    session_id = request.cookies.get("session_id", None)
+
+    if session_id is None:
+        raise HTTPException(403)
+
+    user = await AUTH.get_user_from_session_id(session_id)
+
+    if user is None:
+        raise HTTPException(403)
+
+    return user
+
+
+async def hello_world(request: Request) -> Response:
+    """ handle the route / and return a message """
+    message = {"message": "Bienvenue"}
+    return JSONResponse(message)
+
+
+async def register_user(request: Request) -> Response:
+    """ Register a new user """
+    email, password = await _form(request, "email", "password")
+    if email is None or password is None:
+        raise HTTPException(400)
+
+    try:
+        await AUTH.register_user(email, password)
+    except ValueError:
+        return JSONResponse({"message": "email already registered"}, 400)
+
+    message = {"email": email, "message": "user created"}
+    return JSONResponse(message)
+
+
+async def log_in(request: Request) -> Response:
+    """ Logs in a user and returns session ID """
+    email, password = await _form(request, "email", "password")
+    if email is None or password is None:
+        raise HTTPException(400)
+
+    if not await AUTH.valid_login(email, password):
+        raise HTTPException(401)
+
+    session_id = await AUTH.create_session(
+        email, request.headers.get("user-agent"))
+
+    message = {"email": email, "message": "logged in"}
+    response = JSONResponse(message)
+
+    response.set_cookie("session_id", session_id)
+
+    return response
+
+
+async def log_out(request: Request) -> Response:
+    """
+    Logs out a user by destroying the session_id cookie
+    """
+    user = await _current_user(request)
+
+    await AUTH.destroy_session(user.id, request.cookies["session_id"])
+
+    return RedirectResponse('/', 302)
+
+
+async def list_sessions(request: Request) -> Response:
+    """ This function returns the sessions of the user, one per device
+    """
+    user = await _current_user(request)
+    session_id = request.cookies["session_id"]
+
+    # Session IDs are credentials: only the current one is pointed out
+    sessions = [{"device": user_session.device,
+                 "created_at": user_session.created_at.isoformat(),
+                 "expires_at": user_session.expires_at.isoformat(),
+                 "current": user_session.id == session_id}
+                for user_session in await AUTH.list_sessions(user.id)]
+
+    return JSONResponse(sessions)
+
+
+async def profile(request: Request) -> Response:
+    """ This function returns the profile of the user """
+    user = await _current_user(request)
+
+    message = {"email": user.email}
+
+    return JSONResponse(message, 200)
+
+
+async def reset_password(request: Request) -> Response:
+    """
+    POST /reset_password
+    """
+    email, = await _form(request, "email")
+    if email is None:
+        raise HTTPException(403)
+
+    try:
+        reset_token = await AUTH.get_reset_password_token(email)
+    except ValueError:
+        raise HTTPException(403)
+
+    message = {"email": email, "reset_token": reset_token}
+
+    return JSONResponse(message, 200)
+
+
+async def update_password(request: Request) -> Response:
+    """ This function updates the password of a user
+    """
+    email, reset_token, new_password = await _form(
+        request, "email", "reset_token", "new_password")
+    if None in (email, reset_token, new_password):
+        raise HTTPException(400)
+
+    try:
+        await AUTH.update_password(reset_token, new_password)
+    except ValueError:
+        raise HTTPException(403)
+
+    message = {"email": email, "message": "Password updated"}
+    return JSONResponse(message, 200)
+
+
+app = Starlette(routes=[
+    Route('/', hello_world, methods=['GET']),
+    Route('/users', register_user, methods=['POST']),
+    Route('/sessions', log_in, methods=['POST']),
+    Route('/sessions', log_out, methods=['DELETE']),
+    Route('/sessions', list_sessions, methods=['GET']),
+    Route('/profile', profile, methods=['GET']),
+    Route('/reset_password', reset_password, methods=['POST']),
+    Route('/reset_password', update_password, methods=['PUT']),
+], lifespan=lifespan)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=5000,
+                limit_concurrency=ASGI_MAX_CONNECTIONS,
+                backlog=ASGI_MAX_CONNECTIONS)
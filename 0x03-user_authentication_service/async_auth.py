@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+""" This module defines the asyncio flavour of the Auth class: the same
+    flows on AsyncDB, with bcrypt awaited on the hasher's thread pool
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from async_db import AsyncDB
+from auth import _generate_uuid
+from password_hasher import default_hasher
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm.exc import NoResultFound
+from typing import List, Union
+from user import SESSION_TTL, User, UserSession
+
+
+class AsyncAuth:
+    """ AsyncAuth class
+    """
+
+    def __init__(self):
+        self._db = AsyncDB()
+        # Calibrates the bcrypt cost factor once, at startup
+        self._hasher = default_hasher()
+
+    async def setup(self) -> None:
+        """ This method prepares the database """
+        await self._db.setup()
+
+    async def close(self) -> None:
+        """ This method closes the database connections """
+        await self._db.close()
+
+    async def _hash_password(self, password: str) -> bytes:
+        """ This method hashes password without blocking the event loop
+        """
+        return await asyncio.wrap_future(self._hasher.hash_async(password))
+
+    async def register_user(self, email: str, password: str) -> User:
+        """  This method takes in an email and password
+        and returns a new User object
+        """
+        hashed_password = await self._hash_password(password)
+        try:
+            return await self._db.add_user(email, hashed_password)
+        except IntegrityError:
+            raise ValueError(f'User {email} already exists')
+
+    async def valid_login(self, email: str, password: str) -> bool:
+        """ This method takes in an email and password
+        and returns true if the password is valid
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            return False
+
+        valid = await asyncio.wrap_future(
+            self._hasher.verify_async(user.hashed_password, password))
+
+        # Transparently upgrade hashes made with an outdated cost factor
+        if valid and self._hasher.needs_rehash(user.hashed_password):
+            await self._db.update_user(
+                user.id, hashed_password=await self._hash_password(password))
+
+        return valid
+
+    async def create_session(self, email: str, device: str = None) -> str:
+        """ This method takes in an email, and optionally the device
+        logging in, and returns a new session ID
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            return None
+
+        session_id = _generate_uuid()
+        expires_at = datetime.utcnow() + timedelta(seconds=SESSION_TTL)
+
+        await self._db.add_session(session_id, user.id, expires_at,
+                                   device=device[:250] if device else None)
+
+        return session_id
+
+    async def get_user_from_session_id(
+            self, session_id: str) -> Union[User, None]:
+        """ This method takes in a session ID and returns a User object
+        """
+        if session_id is None:
+            return None
+
+        try:
+            return await self._db.find_user_by_session(session_id)
+        except NoResultFound:
+            return None
+
+    async def destroy_session(self, user_id: int,
+                              session_id: str = None) -> None:
+        """ This method takes in a user_id, and optionally one of its
+        session IDs, and deletes that session, or every session of the user
+        """
+        await self._db.delete_sessions(user_id, session_id)
+
+    async def list_sessions(self, user_id: int) -> List[UserSession]:
+        """ This method takes in a user_id and returns the sessions
+        of the user, newest first
+        """
+        return await self._db.find_sessions(user_id)
+
+    async def get_reset_password_token(self, email: str) -> str:
+        """ This method takes in an email and returns a reset token
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            raise ValueError
+
+        token = _generate_uuid()
+
+        await self._db.update_user(user.id, reset_token=token)
+
+        return token
+
+    async def update_password(self, reset_token: str, password: str) -> None:
+        """ This method takes in a reset token and a password
+        and returns None after updating the user's password
+        """
+        if reset_token is None or password is None:
+            return None
+
+        try:
+            user = await self._db.find_user_by(reset_token=reset_token)
+        except NoResultFound:
+            raise ValueError
+
+        hashed_pwd = await self._hash_password(password)
+        await self._db.update_user(user.id,
+                                   hashed_password=hashed_pwd,
+                                   reset_token=None)
+
+    async def sweep_sessions(self, interval: float, batch_size: int,
+                             pause: float = 0.01) -> None:
+        """ This method deletes expired sessions every interval seconds,
+        one batch per transaction, until cancelled
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                while await self._db.delete_expired_sessions(
+                        batch_size) >= batch_size:
+                    await asyncio.sleep(pause)
+            except SQLAlchemyError:
+                # Retried at the next sweep
+                logging.getLogger(__name__).exception("session sweep failed")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+""" This module defines the asyncio flavour of the DB class, used by the
+    ASGI app. It needs an async driver: aiosqlite for SQLite
+"""
+from datetime import datetime
+from sqlalchemy import delete, event, select
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy.util import greenlet_spawn
+from db import (COLUMNS, DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+                DB_URL, DELETE_EXPIRED, LOOKUPS, USER_BY_SESSION,
+                _set_sqlite_pragmas, setup_schema, update_by_id)
+from user import User, UserSession
+
+# Async driver of each database, when the URL does not name one
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_url(url: str) -> str:
+    """ This function returns url with the async driver of its database
+    """
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def make_async_engine(url: str = None) -> AsyncEngine:
+    """ This function creates the async engine of a database URL, with
+    the same pool bounds and SQLite tuning as make_engine
+    """
+    url = async_url(url or DB_URL)
+    if not url.startswith("sqlite"):
+        return create_async_engine(
+            url, pool_pre_ping=True, pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    if url.endswith(("://", ":///:memory:")):
+        # One in-memory database only exists on one connection
+        engine = create_async_engine(url, poolclass=StaticPool)
+    else:
+        engine = create_async_engine(
+            url, poolclass=AsyncAdaptedQueuePool, pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+class AsyncDB:
+    """ AsyncDB class to interact with the database from a coroutine.
+    Every method runs in its own short session, so a request holds a
+    pooled connection only while it talks to the database
+    """
+
+    def __init__(self, url: str = None):
+        """ Initialize a new AsyncDB instance """
+        self._engine = make_async_engine(url)
+        self._sessions = sessionmaker(self._engine, class_=AsyncSession,
+                                      expire_on_commit=False)
+
+    async def setup(self, reset: bool = None) -> None:
+        """ This method creates and migrates the schema, like DB() does
+        """
+        await greenlet_spawn(setup_schema, self._engine.sync_engine, reset)
+
+    async def close(self) -> None:
+        """ This method closes every pooled connection """
+        await self._engine.dispose()
+
+    async def add_user(self, email: str, hashed_password: str) -> User:
+        """ this method adds a new user to the database
+        and returns the corresponding User object, or raises
+        IntegrityError if the email is already registered
+        """
+        user = User(email=email, hashed_password=hashed_password)
+        async with self._sessions() as session:
+            session.add(user)
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                raise
+
+        return user
+
+    async def find_user_by(self, **kwargs) -> User:
+        """ This method takes in arbitrary keyword arguments
+        and returns the first row found in the users table
+        """
+        if not kwargs:
+            raise InvalidRequestError
+        for key in kwargs.keys():
+            if not hasattr(User, key):
+                raise InvalidRequestError
+        async with self._sessions() as session:
+            if len(kwargs) == 1 and next(iter(kwargs)) == "id":
+                user = await session.get(User, kwargs["id"])
+            elif len(kwargs) == 1 and next(iter(kwargs)) in LOOKUPS:
+                (key, value), = kwargs.items()
+                result = await session.execute(LOOKUPS[key],
+                                               {"value": value})
+                user = result.scalars().first()
+            else:
+                result = await session.execute(
+                    select(User).filter_by(**kwargs).limit(1))
+                user = result.scalars().first()
+        if user is None:
+            raise NoResultFound
+        return user
+
+    async def update_user(self, user_id: int, **kwargs) -> None:
+        """ This method takes a required integer argument
+        user_id and arbitrary keyword arguments, and returns None
+        """
+        for key in kwargs.keys():
+            if key not in COLUMNS:
+                raise ValueError(f'User has no attribute {key}')
+        if not kwargs:
+            return None
+
+        keys = tuple(sorted(kwargs))
+        params = {"new_" + key: kwargs[key] for key in keys}
+        params["user_id"] = user_id
+        async with self._sessions() as session:
+            result = await session.execute(
+                update_by_id(keys), params,
+                execution_options={"synchronize_session": False})
+            if result.rowcount == 0:
+                await session.rollback()
+                raise ValueError(f'User with id {user_id} not found')
+            await session.commit()
+
+    async def add_session(self, session_id: str, user_id: int,
+                          expires_at: datetime,
+                          device: str = None) -> UserSession:
+        """ This method stores a new session of a user and returns it
+        """
+        user_session = UserSession(id=session_id, user_id=user_id,
+                                   device=device,
+                                   created_at=datetime.utcnow(),
+                                   expires_at=expires_at)
+        async with self._sessions() as session:
+            session.add(user_session)
+            await session.commit()
+        return user_session
+
+    async def find_user_by_session(self, session_id: str) -> User:
+        """ This method returns the user of a session that has not
+        expired, or raises NoResultFound
+        """
+        async with self._sessions() as session:
+            result = await session.execute(USER_BY_SESSION, {
+                "session_id": session_id, "now": datetime.utcnow()})
+            user = result.scalars().first()
+        if user is None:
+            raise NoResultFound
+        return user
+
+    async def find_sessions(self, user_id: int) -> list:
+        """ This method returns the sessions of a user, newest first
+        """
+        async with self._sessions() as session:
+            result = await session.execute(
+                select(UserSession).where(UserSession.user_id == user_id)
+                .order_by(UserSession.created_at.desc()))
+            return result.scalars().all()
+
+    async def delete_sessions(self, user_id: int,
+                              session_id: str = None) -> int:
+        """ This method deletes one session of a user, or all of them,
+        and returns the number deleted
+        """
+        statement = delete(UserSession).where(UserSession.user_id == user_id)
+        if session_id is not None:
+            statement = statement.where(UserSession.id == session_id)
+        async with self._sessions() as session:
+            result = await session.execute(
+                statement, execution_options={"synchronize_session": False})
+            await session.commit()
+        return result.rowcount
+
+    async def delete_expired_sessions(self, batch_size: int = 500) -> int:
+        """ This method deletes one batch of expired sessions, in its own
+        transaction, and returns the number deleted
+        """
+        async with self._sessions() as session:
+            result = await session.execute(
+                DELETE_EXPIRED,
+                {"now": datetime.utcnow(), "batch_size": batch_size},
+                execution_options={"synchronize_session": False})
+            await session.commit()
+        return result.rowcount
@@ -4,11 +4,13 @@
     and defines the table called users and its columns
 """
 
-import bcrypt
+from datetime import datetime, timedelta
 from db import DB
+from password_hasher import default_hasher
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
-from typing import Union
-from user import User
+from typing import List, Union
+from user import SESSION_TTL, User, UserSession
 from uuid import uuid4
 
 
@@ -16,8 +18,7 @@ def _hash_password(password: str) -> str:
     """ This function takes in a string password
     and returns a hashed version of the password
     """
-    hashed_pwd = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-    return hashed_pwd
+    return default_hasher().hash(password)
 
 
 def _generate_uuid() -> str:
@@ -33,21 +34,25 @@ class Auth:
 
     def __init__(self):
         self._db = DB()
+        # Calibrates the bcrypt cost factor once, at startup
+        self._hasher = default_hasher()
+
+    def close_session(self) -> None:
+        """ This method releases the DB session of the current thread
+        """
+        self._db.remove_session()
 
     def register_user(self, email: str, password: str) -> User:
         """  This method takes in an email and password
         and returns a new User object
         """
 
+        # One insert: the unique index on email settles concurrent
+        # registrations of the same address
+        hashed_password = _hash_password(password)
         try:
-            user = self._db.find_user_by(email=email)
-        except NoResultFound:
-            hashed_password = _hash_password(password)
-            user = self._db.add_user(email, hashed_password)
-
-            return user
-
-        else:
+            return self._db.add_user(email, hashed_password)
+        except IntegrityError:
             raise ValueError(f'User {email} already exists')
 
     def valid_login(self, email: str, password: str) -> bool:
@@ -59,16 +64,19 @@ class Auth:
         except NoResultFound:
             return False
 
-        plain_password = user.hashed_password
-        encoded_password = password.encode()
+        valid, new_hash = self._hasher.verify_and_update(
+            user.hashed_password, password)
 
-        if bcrypt.checkpw(encoded_password, plain_password):
-            return True
+        # Transparently upgrade hashes made with an outdated cost factor
+        if new_hash is not None:
+            self._db.update_user(user.id, hashed_password=new_hash)
 
-        return False
+        return valid
 
-    def create_session(self, email: str) -> str:
-        """ This method takes in an email and returns a session ID
+    def create_session(self, email: str, device: str = None) -> str:
+        """ This method takes in an email, and optionally the device
+        logging in, and returns a new session ID. Other sessions of
+        the user stay valid
         """
         try:
             user = self._db.find_user_by(email=email)
@@ -76,8 +84,10 @@ class Auth:
             return None
 
         session_id = _generate_uuid()
+        expires_at = datetime.utcnow() + timedelta(seconds=SESSION_TTL)
 
-        self._db.update_user(user.id, session_id=session_id)
+        self._db.add_session(session_id, user.id, expires_at,
+                             device=device[:250] if device else None)
 
         return session_id
 
@@ -88,25 +98,27 @@ class Auth:
             return None
 
         try:
-            user = self._db.find_user_by(session_id=session_id)
+            user = self._db.find_user_by_session(session_id)
         except NoResultFound:
             return None
 
         return user
 
-    def destroy_session(self, user_id: int) -> None:
-        """ This method takes in a user_id and returns None
-        after updating the user's session ID to None
+    def destroy_session(self, user_id: int, session_id: str = None) -> None:
+        """ This method takes in a user_id, and optionally one of its
+        session IDs, and returns None after deleting that session,
+        or every session of the user
         """
-        try:
-            user = self._db.find_user_by(id=user_id)
-        except NoResultFound:
-            return None
-
-        self._db.update_user(user.id, session_id=None)
+        self._db.delete_sessions(user_id, session_id)
 
         return None
 
+    def list_sessions(self, user_id: int) -> List[UserSession]:
+        """ This method takes in a user_id and returns the sessions
+        of the user, newest first
+        """
+        return self._db.find_sessions(user_id)
+
     def get_reset_password_token(self, email: str) -> str:
         """ This method takes in an email and returns a reset token
         """
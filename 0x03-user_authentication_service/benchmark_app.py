@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+""" This module drives app.py, asgi_app.py or both with concurrent
+    clients and reports the throughput and latency percentiles of /profile
+    and /reset_password
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+from typing import List, Tuple
+from urllib.parse import urlencode
+
+# Command serving each app on a port
+SERVERS = {
+    "flask": "from app import app; app.run(host='127.0.0.1', port={port}, "
+             "threaded=True)",
+    "asgi": "import uvicorn; from asgi_app import app, ASGI_MAX_CONNECTIONS; "
+            "uvicorn.run(app, host='127.0.0.1', port={port}, "
+            "log_level='warning', limit_concurrency=ASGI_MAX_CONNECTIONS, "
+            "backlog=ASGI_MAX_CONNECTIONS)",
+}
+
+
+class Client:
+    """ Client class: one keep-alive HTTP connection with a cookie jar
+    """
+
+    def __init__(self, host: str, port: int):
+        """ Initialize a new Client instance """
+        self._conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.cookies = {}
+
+    def request(self, method: str, path: str,
+                data: dict = None) -> Tuple[int, bytes]:
+        """ This method sends one request, form encoding data, and returns
+        the status and body of the response
+        """
+        headers = {}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(
+                "{}={}".format(k, v) for k, v in self.cookies.items())
+        try:
+            self._conn.request(method, path, body, headers)
+            response = self._conn.getresponse()
+        except (ConnectionError, http.client.HTTPException):
+            # Closed by the server: reconnect once
+            self._conn.close()
+            self._conn.request(method, path, body, headers)
+            response = self._conn.getresponse()
+        payload = response.read()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if response.will_close:
+            self._conn.close()
+        return response.status, payload
+
+    def close(self) -> None:
+        """ This method closes the connection, the next request reopens it
+        """
+        self._conn.close()
+
+
+def start_server(port: int, env: dict = None,
+                 app: str = "flask") -> subprocess.Popen:
+    """ This function starts one of SERVERS on port and waits until it
+    answers
+    """
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVERS[app].format(port=port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=dict(os.environ, **(env or {})),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(300):
+        try:
+            Client("127.0.0.1", port).request("GET", "/")
+            return server
+        except ConnectionError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("{} did not start on port {}".format(app, port))
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """ This function returns the p-th percentile of sorted samples
+    """
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def client(host: str, port: int, email: str, duration: float,
+           write_every: int, latencies: List[float],
+           errors: List[int]) -> None:
+    """ This function logs in once, then sends GET /profile, and every
+    write_every requests POST /reset_password, until duration is over.
+    Refused or reset connections count as errors with status 0
+    """
+    session = Client(host, port)
+    try:
+        status, _ = session.request("POST", "/sessions",
+                                    {"email": email, "password": "pwd"})
+    except (OSError, http.client.HTTPException):
+        status = 0
+    if status != 200:
+        errors.append(status)
+        return
+    deadline = time.perf_counter() + duration
+    sent = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        sent += 1
+        try:
+            if write_every and sent % write_every == 0:
+                status, _ = session.request("POST", "/reset_password",
+                                            {"email": email})
+            else:
+                status, _ = session.request("GET", "/profile")
+        except (OSError, http.client.HTTPException):
+            session.close()
+            status = 0
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(status)
+
+
+def run(host: str, port: int, clients: int, duration: float,
+        write_every: int) -> dict:
+    """ This function registers one user per client, runs the clients
+    concurrently and returns the throughput and latency percentiles
+    """
+    setup = Client(host, port)
+    for i in range(clients):
+        setup.request("POST", "/users", {
+            "email": "bench{}@example.com".format(i), "password": "pwd"})
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(
+        host, port, "bench{}@example.com".format(i), duration, write_every,
+        latencies, errors)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {"requests": len(latencies), "errors": len(errors),
+            "throughput": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--app", choices=sorted(SERVERS) + ["both"],
+                        default="flask")
+    parser.add_argument("--external", action="store_true",
+                        help="benchmark an app already running on "
+                             "host:port instead of starting one")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--write-every", type=int, default=10,
+                        help="one POST /reset_password every N requests, "
+                             "0 for reads only")
+    args = parser.parse_args()
+
+    apps = sorted(SERVERS) if args.app == "both" else [args.app]
+    for app in apps:
+        server = None
+        if not args.external:
+            # Cheap hashes: the benchmark measures the request path, not
+            # bcrypt. Every app starts from its own empty database
+            db_path = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+            server = start_server(args.port, {
+                "BCRYPT_ROUNDS": "4", "DB_URL": "sqlite:///" + db_path}, app)
+        try:
+            result = run(args.host, args.port, args.clients, args.duration,
+                         args.write_every)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        print("{app:<6} {requests} requests, {errors} errors, "
+              "{throughput:.0f} req/s, p50 {p50_ms:.2f} ms, "
+              "p99 {p99_ms:.2f} ms".format(app=app, **result))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+""" This module measures the lookups behind /profile and /sessions on a
+    large users table, before and after the index migrations
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+import bcrypt
+from sqlalchemy import text
+
+
+def timings(call: Callable, args: List) -> dict:
+    """ This function calls call on each argument and returns the mean
+    and p99 latency in milliseconds
+    """
+    samples = []
+    for arg in args:
+        start = time.perf_counter()
+        call(arg)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"mean_ms": sum(samples) / len(samples),
+            "p99_ms": samples[min(len(samples) - 1,
+                                  int(len(samples) * 0.99))]}
+
+
+def measure(auth, emails: List[str], session_ids: List[str],
+            samples: int) -> dict:
+    """ This function times the handler work of GET /profile (session
+    lookup) and POST /sessions (login check, then new session)
+    """
+    def profile(session_id: str) -> None:
+        assert auth.get_user_from_session_id(session_id) is not None
+
+    def log_in(email: str) -> None:
+        assert auth.valid_login(email, "pwd")
+        auth.create_session(email)
+    return {
+        "/profile": timings(profile, session_ids[:samples]),
+        "/sessions": timings(log_in, emails[:samples]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    os.environ.update({"DB_URL": "sqlite:///" + db_path, "DB_RESET": "0",
+                       "BCRYPT_ROUNDS": "4"})
+    from auth import Auth
+    from migrations import upgrade
+    from user import SESSION_TTL, User, UserSession
+
+    auth = Auth()
+    engine = auth._db._engine
+    # The schema as it was before the migrations: the sessions table only
+    # keeps its primary key
+    with engine.begin() as conn:
+        for table in (User.__table__, UserSession.__table__):
+            for index in table.indexes:
+                conn.execute(text("DROP INDEX {}".format(index.name)))
+        conn.execute(text("UPDATE schema_version SET version = 0"))
+
+    hashed = bcrypt.hashpw(b"pwd", bcrypt.gensalt(4))
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=SESSION_TTL)
+    emails, session_ids = [], []
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        for first in range(0, args.users, 50000):
+            users, sessions = [], []
+            for i in range(first, min(first + 50000, args.users)):
+                users.append({"id": i + 1,
+                              "email": "user{}@example.com".format(i),
+                              "hashed_password": hashed})
+                sessions.append({"id": str(uuid.uuid4()), "user_id": i + 1,
+                                 "created_at": now,
+                                 "expires_at": expires_at})
+            conn.execute(User.__table__.insert(), users)
+            conn.execute(UserSession.__table__.insert(), sessions)
+            emails.append(users[-1]["email"])
+            session_ids.append(sessions[-1]["id"])
+    print("loaded {} users in {:.1f} s".format(
+        args.users, time.perf_counter() - start))
+    # Spread the probes over the table, then repeat them
+    emails = (emails * args.samples)[:args.samples]
+    session_ids = (session_ids * args.samples)[:args.samples]
+
+    before = measure(auth, emails, session_ids, args.samples)
+    start = time.perf_counter()
+    upgrade(engine)
+    print("migrated in {:.1f} s".format(time.perf_counter() - start))
+    after = measure(auth, emails, session_ids, args.samples)
+
+    print("{:<10} {:>18} {:>18}".format("route", "before mean/p99",
+                                        "after mean/p99"))
+    for route in before:
+        print("{:<10} {:>8.2f}/{:>7.2f}ms {:>8.2f}/{:>7.2f}ms".format(
+            route, before[route]["mean_ms"], before[route]["p99_ms"],
+            after[route]["mean_ms"], after[route]["p99_ms"]))
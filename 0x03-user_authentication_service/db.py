@@ -1,41 +1,155 @@
 #!/usr/bin/env python3
 """DB module
 """
-from sqlalchemy import create_engine
+import os
+from datetime import datetime
+from functools import lru_cache
+from sqlalchemy import (bindparam, create_engine, delete, event, select,
+                        update)
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.orm.session import Session
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.pool import QueuePool, StaticPool
 from typing import TypeVar
-from user import Base, User
+from migrations import upgrade
+from user import Base, User, UserSession
+
+# Database URL, any SQLAlchemy URL: sqlite:///a.db, postgresql://...
+DB_URL = os.getenv("DB_URL", "sqlite:///a.db")
+# Start from an empty database; 0 keeps the data and migrates its schema
+DB_RESET = os.getenv("DB_RESET", "1") != "0"
+# Connections kept open, and extra ones allowed under load
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Seconds a request waits for a free connection
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Applied to every new SQLite connection: WAL lets readers run while one
+# writer commits, and NORMAL sync is durable across crashes in WAL mode
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+# Statements of the fixed lookup shapes, built once: executing them only
+# binds the value, and SQLAlchemy reuses their compiled form
+LOOKUPS = {
+    column: select(User).where(
+        getattr(User, column) == bindparam("value")).limit(1)
+    for column in ("email", "session_id", "reset_token")
+}
+COLUMNS = frozenset(User.__table__.columns.keys())
+# The user of a live session: primary key lookup joined on users.id
+USER_BY_SESSION = select(User).join(
+    UserSession, UserSession.user_id == User.id).where(
+    UserSession.id == bindparam("session_id"),
+    UserSession.expires_at > bindparam("now"))
+# One batch of expired sessions, found through ix_sessions_expires_at
+DELETE_EXPIRED = delete(UserSession).where(UserSession.id.in_(
+    select(UserSession.id).where(UserSession.expires_at <= bindparam("now"))
+    .limit(bindparam("batch_size")).scalar_subquery()))
+
+
+@lru_cache(maxsize=None)
+def update_by_id(keys: tuple):
+    """ This function returns the statement updating the given columns
+    of the user whose id is bound to user_id
+    """
+    return update(User).where(User.id == bindparam("user_id")).values(
+        {key: bindparam("new_" + key) for key in keys})
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """ This function tunes a new SQLite connection
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def make_engine(url: str = None, pool_size: int = None,
+                max_overflow: int = None,
+                pool_timeout: float = None) -> Engine:
+    """ This function creates the engine of a database URL, pooled
+    and, for SQLite, shareable between threads and tuned
+    """
+    url = url or DB_URL
+    pool_args = {
+        "pool_size": DB_POOL_SIZE if pool_size is None else pool_size,
+        "max_overflow": (DB_MAX_OVERFLOW if max_overflow is None
+                         else max_overflow),
+        "pool_timeout": (DB_POOL_TIMEOUT if pool_timeout is None
+                         else pool_timeout),
+    }
+    if not url.startswith("sqlite"):
+        return create_engine(url, echo=False, pool_pre_ping=True,
+                             **pool_args)
+    connect_args = {"check_same_thread": False}
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # One in-memory database only exists on one connection
+        engine = create_engine(url, echo=False, poolclass=StaticPool,
+                               connect_args=connect_args)
+    else:
+        engine = create_engine(url, echo=False, poolclass=QueuePool,
+                               connect_args=connect_args, **pool_args)
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def setup_schema(engine: Engine, reset: bool = None) -> None:
+    """ This function creates the tables, after dropping them if reset,
+    and applies the pending migrations
+    """
+    if DB_RESET if reset is None else reset:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    upgrade(engine)
 
 
 class DB:
     """ DB class to interact with the database"""
 
-    def __init__(self):
+    def __init__(self, url: str = None, reset: bool = None):
         """ Initialize a new DB instance """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
-        Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+        self._engine = make_engine(url)
+        setup_schema(self._engine, reset)
+        # One session per thread; objects stay usable after a commit
+        self.__session = scoped_session(
+            sessionmaker(bind=self._engine, expire_on_commit=False))
 
     @property
     def _session(self) -> Session:
-        """ Memoized session object """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        """ Session object of the current thread """
+        return self.__session()
+
+    def remove_session(self) -> None:
+        """ This method closes the session of the current thread
+        and gives its connection back to the pool
+        """
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """ this method adds a new user to the database
-        and returns the corresponding User object
+        and returns the corresponding User object, or raises
+        IntegrityError if the email is already registered
         """
         user = User(email=email, hashed_password=hashed_password)
         self._session.add(user)
-        self._session.commit()
+        try:
+            self._session.commit()
+        except IntegrityError:
+            self._session.rollback()
+            raise
 
         return user
 
@@ -45,6 +159,21 @@ class DB:
         """
         if not kwargs:
             raise InvalidRequestError
+        if len(kwargs) == 1:
+            (key, value), = kwargs.items()
+            user = None
+            if key == "id":
+                # Served by the identity map when already loaded
+                user = self._session.get(User, value)
+            elif key in LOOKUPS:
+                user = self._session.execute(
+                    LOOKUPS[key], {"value": value}).scalars().first()
+            else:
+                key = None
+            if key is not None:
+                if user is None:
+                    raise NoResultFound
+                return user
         for key in kwargs.keys():
             if not hasattr(User, key):
                 raise InvalidRequestError
@@ -62,14 +191,86 @@ class DB:
         """ This method takes a required integer argument
         user_id and arbitrary keyword arguments, and returns None
         """
-        try:
-            user = self.find_user_by(id=user_id)
-        except NoResultFound:
+        for key in kwargs.keys():
+            if key not in COLUMNS:
+                raise ValueError(f'User has no attribute {key}')
+        if not kwargs:
+            return None
+
+        # One UPDATE by primary key, no SELECT first
+        keys = tuple(sorted(kwargs))
+        params = {"new_" + key: kwargs[key] for key in keys}
+        params["user_id"] = user_id
+        result = self._session.execute(
+            update_by_id(keys), params,
+            execution_options={"synchronize_session": False})
+        if result.rowcount == 0:
+            self._session.rollback()
             raise ValueError(f'User with id {user_id} not found')
+        self._session.commit()
+        # Keep the copy loaded in this session, if any, up to date
+        user = self._session.identity_map.get(identity_key(User, user_id))
+        if user is not None:
+            for key in keys:
+                set_committed_value(user, key, kwargs[key])
 
-        for key, value in kwargs.items():
-            if not hasattr(user, key):
-                raise ValueError(f'User has no attribute {key}')
-            setattr(user, key, value)
+    def add_session(self, session_id: str, user_id: int, expires_at: datetime,
+                    device: str = None) -> UserSession:
+        """ This method stores a new session of a user and returns it
+        """
+        user_session = UserSession(id=session_id, user_id=user_id,
+                                   device=device,
+                                   created_at=datetime.utcnow(),
+                                   expires_at=expires_at)
+        self._session.add(user_session)
+        self._session.commit()
+        return user_session
 
+    def find_user_by_session(self, session_id: str) -> User:
+        """ This method returns the user of a session that has not
+        expired, or raises NoResultFound
+        """
+        user = self._session.execute(USER_BY_SESSION, {
+            "session_id": session_id, "now": datetime.utcnow()
+        }).scalars().first()
+        if user is None:
+            raise NoResultFound
+        return user
+
+    def find_sessions(self, user_id: int) -> list:
+        """ This method returns the sessions of a user, newest first
+        """
+        return self._session.execute(
+            select(UserSession).where(UserSession.user_id == user_id)
+            .order_by(UserSession.created_at.desc())).scalars().all()
+
+    def delete_sessions(self, user_id: int, session_id: str = None) -> int:
+        """ This method deletes one session of a user, or all of them,
+        and returns the number deleted
+        """
+        statement = delete(UserSession).where(UserSession.user_id == user_id)
+        if session_id is not None:
+            statement = statement.where(UserSession.id == session_id)
+        result = self._session.execute(
+            statement, execution_options={"synchronize_session": False})
         self._session.commit()
+        return result.rowcount
+
+    def delete_expired_sessions(self, batch_size: int = 500,
+                                max_batches: int = None) -> int:
+        """ This method deletes the sessions expired by now, batch_size
+        rows per transaction so the write lock is held only briefly,
+        and returns the number deleted
+        """
+        now = datetime.utcnow()
+        deleted = batches = 0
+        while max_batches is None or batches < max_batches:
+            result = self._session.execute(
+                DELETE_EXPIRED, {"now": now, "batch_size": batch_size},
+                execution_options={"synchronize_session": False})
+            self._session.commit()
+            deleted += result.rowcount
+            batches += 1
+            if result.rowcount < batch_size:
+                break
+        return deleted
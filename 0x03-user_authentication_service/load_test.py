@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+""" This module load tests the user auth service: concurrent virtual
+    users replay the end-to-end scenarios of main.py and the throughput,
+    latency percentiles and error rates of every route are reported as
+    JSON
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+from benchmark_app import SERVERS, Client, percentile, start_server
+
+PASSWD = "b4l0u"
+NEW_PASSWD = "t4rt1fl3tt3"
+
+
+class Recorder:
+    """ Recorder class: latencies and failures of every route, shared by
+    the virtual users
+    """
+
+    def __init__(self):
+        """ Initialize a new Recorder instance """
+        self._lock = threading.Lock()
+        # route -> latencies in seconds, route -> {status: failures}
+        self.latencies = {}
+        self.failures = {}
+
+    def record(self, route: str, seconds: float, ok: bool,
+               status: int) -> None:
+        """ This method records one request of a route """
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                failures = self.failures.setdefault(route, {})
+                failures[str(status)] = failures.get(str(status), 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        """ This method returns the totals and per route statistics """
+        routes = {}
+        with self._lock:
+            items = sorted((route, sorted(samples)) for route, samples
+                           in self.latencies.items())
+            failures = {route: dict(counts) for route, counts
+                        in self.failures.items()}
+        for route, samples in items:
+            errors = sum(failures.get(route, {}).values())
+            routes[route] = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": errors / len(samples),
+                "failed_statuses": failures.get(route, {}),
+                "throughput": len(samples) / elapsed,
+                "p50_ms": percentile(samples, 50) * 1000,
+                "p90_ms": percentile(samples, 90) * 1000,
+                "p99_ms": percentile(samples, 99) * 1000,
+                "max_ms": samples[-1] * 1000,
+            }
+        requests = sum(route["requests"] for route in routes.values())
+        errors = sum(route["errors"] for route in routes.values())
+        return {"elapsed_s": elapsed, "requests": requests,
+                "errors": errors,
+                "error_rate": errors / requests if requests else 0.0,
+                "throughput": requests / elapsed, "routes": routes}
+
+
+class VirtualUser:
+    """ VirtualUser class: one client of the service, with its own
+    account and keep-alive connection. Its steps are the checks of main.py
+    """
+
+    def __init__(self, number: int, host: str, port: int,
+                 recorder: Recorder):
+        """ Initialize a new VirtualUser instance """
+        self.number = number
+        self.client = Client(host, port)
+        self.email = "vu{}@example.com".format(number)
+        self.password = PASSWD
+        self.logged_in = False
+        self.journeys = 0
+        self._recorder = recorder
+
+    def call(self, method: str, path: str, data: dict = None,
+             status: int = 200, check: Callable[[dict], bool] = None):
+        """ This method sends one request and records it as failed unless
+        it answers status and its JSON body passes check. Returns the
+        body, or None on failure
+        """
+        start = time.perf_counter()
+        try:
+            got, payload = self.client.request(method, path, data)
+        except (OSError, http.client.HTTPException):
+            self.client.close()
+            got, payload = 0, b""
+        elapsed = time.perf_counter() - start
+        body, ok = {}, got == status
+        if ok and check is not None:
+            try:
+                body = json.loads(payload)
+                ok = check(body)
+            except ValueError:
+                ok = False
+        self._recorder.record("{} {}".format(method, path), elapsed, ok,
+                              got)
+        return body if ok else None
+
+    def register_user(self, email: str, password: str) -> bool:
+        """ POST /users creates the account """
+        return self.call("POST", "/users", {
+            "email": email, "password": password},
+            check=lambda body: body == {"email": email,
+                                        "message": "user created"}
+        ) is not None
+
+    def log_in_wrong_password(self, email: str, password: str) -> bool:
+        """ POST /sessions refuses a wrong password """
+        return self.call("POST", "/sessions", {
+            "email": email, "password": password}, status=401) is not None
+
+    def profile_unlogged(self) -> bool:
+        """ GET /profile refuses an empty session cookie """
+        cookies = self.client.cookies
+        self.client.cookies = {"session_id": ""}
+        try:
+            return self.call("GET", "/profile", status=403) is not None
+        finally:
+            self.client.cookies = cookies
+
+    def log_in(self, email: str, password: str) -> bool:
+        """ POST /sessions sets the session cookie """
+        self.logged_in = self.call("POST", "/sessions", {
+            "email": email, "password": password},
+            check=lambda body: body == {"email": email,
+                                        "message": "logged in"}
+        ) is not None and "session_id" in self.client.cookies
+        return self.logged_in
+
+    def profile_logged(self, email: str) -> bool:
+        """ GET /profile returns the email of the session's user """
+        return self.call("GET", "/profile",
+                         check=lambda body: body == {"email": email}
+                         ) is not None
+
+    def log_out(self) -> bool:
+        """ DELETE /sessions redirects to GET / """
+        ok = self.call("DELETE", "/sessions", status=302) is not None
+        self.client.cookies.pop("session_id", None)
+        self.logged_in = False
+        return ok and self.call(
+            "GET", "/", check=lambda body: body == {"message": "Bienvenue"}
+        ) is not None
+
+    def reset_password_token(self, email: str) -> str:
+        """ POST /reset_password returns a reset token, or None """
+        body = self.call("POST", "/reset_password", {"email": email},
+                         check=lambda body: body == {
+                             "email": email,
+                             "reset_token": body.get("reset_token")})
+        return body["reset_token"] if body else None
+
+    def update_password(self, email: str, reset_token: str,
+                        new_password: str) -> bool:
+        """ PUT /reset_password sets a new password """
+        return self.call("PUT", "/reset_password", {
+            "email": email, "reset_token": reset_token,
+            "new_password": new_password},
+            check=lambda body: body == {"email": email,
+                                        "message": "Password updated"}
+        ) is not None
+
+
+def journey(user: VirtualUser) -> None:
+    """ The run of main.py, on a new account """
+    user.journeys += 1
+    email = "vu{}-{}@example.com".format(user.number, user.journeys)
+    cookies, user.client.cookies = user.client.cookies, {}
+    try:
+        if not user.register_user(email, PASSWD):
+            return
+        user.log_in_wrong_password(email, NEW_PASSWD)
+        user.profile_unlogged()
+        if user.log_in(email, PASSWD):
+            user.profile_logged(email)
+            user.log_out()
+        reset_token = user.reset_password_token(email)
+        if reset_token and user.update_password(email, reset_token,
+                                                NEW_PASSWD):
+            user.log_in(email, NEW_PASSWD)
+    finally:
+        user.client.cookies = cookies
+        user.logged_in = "session_id" in cookies
+
+
+def browse(user: VirtualUser) -> None:
+    """ Profile reads of a logged in user """
+    if user.logged_in or user.log_in(user.email, user.password):
+        for _ in range(5):
+            user.profile_logged(user.email)
+
+
+def reset(user: VirtualUser) -> None:
+    """ Password reset of the user's own account """
+    reset_token = user.reset_password_token(user.email)
+    if reset_token:
+        user.update_password(user.email, reset_token, user.password)
+
+
+SCENARIOS = {"journey": journey, "browse": browse, "reset": reset}
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """ This function parses a scenario mix such as browse=8,journey=1
+    """
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(
+                "unknown scenario {!r}, expected one of {}".format(
+                    name.strip(), ", ".join(sorted(SCENARIOS))))
+        try:
+            mix[name.strip()] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                "wrong weight {!r}".format(weight))
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("the mix has no positive weight")
+    return mix
+
+
+def virtual_user(user: VirtualUser, mix: Dict[str, float], start: float,
+                 deadline: float, think: float, seed: int) -> None:
+    """ This function registers the user once, at start, then runs
+    scenarios picked by weight from mix until the deadline
+    """
+    time.sleep(max(0.0, start - time.perf_counter()))
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    user.register_user(user.email, user.password)
+    while time.perf_counter() < deadline:
+        SCENARIOS[rng.choices(names, weights)[0]](user)
+        if think:
+            time.sleep(rng.uniform(0, 2 * think))
+
+
+def run(host: str, port: int, users: int, mix: Dict[str, float],
+        ramp_up: float, duration: float, think: float = 0,
+        seed: int = 0) -> dict:
+    """ This function starts users virtual users evenly over ramp_up
+    seconds, runs them for duration seconds more and returns the report
+    """
+    recorder = Recorder()
+    begin = time.perf_counter()
+    deadline = begin + ramp_up + duration
+    threads = [threading.Thread(target=virtual_user, args=(
+        VirtualUser(number, host, port, recorder), mix,
+        begin + ramp_up * number / users, deadline, think, seed + number))
+        for number in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.perf_counter() - begin)
+
+
+def violations(report: dict, max_error_rate: float = None,
+               max_p99_ms: float = None) -> List[str]:
+    """ This function returns the routes over the given thresholds """
+    found = []
+    for route, stats in report["routes"].items():
+        if max_error_rate is not None and \
+                stats["error_rate"] > max_error_rate:
+            found.append("{}: error rate {:.4f} > {}".format(
+                route, stats["error_rate"], max_error_rate))
+        if max_p99_ms is not None and stats["p99_ms"] > max_p99_ms:
+            found.append("{}: p99 {:.2f} ms > {} ms".format(
+                route, stats["p99_ms"], max_p99_ms))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--app", choices=sorted(SERVERS), default="flask")
+    parser.add_argument("--external", action="store_true",
+                        help="load an app already running on host:port "
+                             "instead of starting one")
+    parser.add_argument("--users", type=int, default=50,
+                        help="concurrent virtual users")
+    parser.add_argument("--mix", type=parse_mix,
+                        default=parse_mix("browse=8,reset=1,journey=1"),
+                        help="scenario weights, among {}".format(
+                            ", ".join(sorted(SCENARIOS))))
+    parser.add_argument("--ramp-up", type=float, default=5,
+                        help="seconds over which the users start")
+    parser.add_argument("--duration", type=float, default=30,
+                        help="seconds of full load after the ramp-up")
+    parser.add_argument("--think", type=float, default=0,
+                        help="mean pause between scenarios, in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bcrypt-rounds", default="4",
+                        help="cost factor of the started app")
+    parser.add_argument("--output", help="write the report to this file")
+    parser.add_argument("--max-error-rate", type=float,
+                        help="fail if a route has a higher error rate")
+    parser.add_argument("--max-p99-ms", type=float,
+                        help="fail if a route has a higher p99 latency")
+    args = parser.parse_args()
+
+    server = None
+    if not args.external:
+        db_path = os.path.join(tempfile.mkdtemp(), "load_test.db")
+        server = start_server(args.port, {
+            "BCRYPT_ROUNDS": args.bcrypt_rounds,
+            "DB_URL": "sqlite:///" + db_path}, args.app)
+    try:
+        report = run(args.host, args.port, args.users, args.mix,
+                     args.ramp_up, args.duration, args.think, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    report["config"] = {
+        "app": "external" if args.external else args.app,
+        "users": args.users, "mix": args.mix, "ramp_up_s": args.ramp_up,
+        "duration_s": args.duration, "think_s": args.think,
+        "seed": args.seed}
+    report["violations"] = violations(report, args.max_error_rate,
+                                      args.max_p99_ms)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for violation in report["violations"]:
+        print(violation, file=sys.stderr)
+    sys.exit(1 if report["violations"] else 0)
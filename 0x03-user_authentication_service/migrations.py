@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+""" This module defines the schema migrations of the user auth service
+    and applies the ones a database has not seen yet
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import (Column, Integer, MetaData, Table, inspect, select,
+                        text)
+from sqlalchemy.engine import Connection, Engine
+from user import SESSION_TTL, User, UserSession
+
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, nullable=False))
+
+
+def _create_index(conn: Connection, index) -> None:
+    """ This function creates a declared index unless it already exists
+    """
+    names = [found['name'] for found
+             in inspect(conn).get_indexes(index.table.name)]
+    if index.name not in names:
+        index.create(conn)
+
+
+def add_unique_lookup_indexes(conn: Connection) -> None:
+    """ Unique indexes on users.email, users.session_id and
+    users.reset_token. Duplicated emails are reported, not deleted
+    """
+    duplicates = conn.execute(text(
+        "SELECT email FROM users GROUP BY email HAVING COUNT(*) > 1"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError("duplicated emails must be merged before "
+                           "migrating: {}".format(", ".join(duplicates)))
+    # Stale duplicated tokens are only invalidated
+    for column in ('session_id', 'reset_token'):
+        conn.execute(text(
+            "UPDATE users SET {0} = NULL WHERE {0} IN (SELECT {0} FROM "
+            "users WHERE {0} IS NOT NULL GROUP BY {0} HAVING COUNT(*) > 1)"
+            .format(column)))
+    for index in User.__table__.indexes:
+        _create_index(conn, index)
+
+
+def move_sessions(conn: Connection) -> None:
+    """ Sessions table. The session of each logged in user moves there
+    and lives for SESSION_TTL from now
+    """
+    UserSession.__table__.create(conn, checkfirst=True)
+    for index in UserSession.__table__.indexes:
+        _create_index(conn, index)
+    now = datetime.utcnow()
+    conn.execute(text(
+        "INSERT INTO sessions (id, user_id, created_at, expires_at) "
+        "SELECT session_id, id, :now, :expires_at FROM users "
+        "WHERE session_id IS NOT NULL"),
+        {"now": now, "expires_at": now + timedelta(seconds=SESSION_TTL)})
+    conn.execute(text("UPDATE users SET session_id = NULL "
+                      "WHERE session_id IS NOT NULL"))
+
+
+# (version, migration): applied in order, each one in its own transaction
+MIGRATIONS = [
+    (1, add_unique_lookup_indexes),
+    (2, move_sessions),
+]
+
+
+def current_version(conn: Connection) -> int:
+    """ This function returns the schema version of a database
+    """
+    schema_version.create(conn, checkfirst=True)
+    version = conn.execute(select(schema_version.c.version)).scalar()
+    if version is None:
+        conn.execute(schema_version.insert().values(version=0))
+        version = 0
+    return version
+
+
+def upgrade(engine: Engine, target: int = None) -> int:
+    """ This function applies the pending migrations, up to target if
+    given, and returns the resulting schema version
+    """
+    with engine.begin() as conn:
+        version = current_version(conn)
+    for number, migration in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        with engine.begin() as conn:
+            migration(conn)
+            conn.execute(schema_version.update().values(version=number))
+        version = number
+    return version
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+""" This module defines the background thread that deletes expired
+    sessions of the user auth service
+"""
+import logging
+import os
+import threading
+from sqlalchemy.exc import SQLAlchemyError
+
+# Seconds between two sweeps, 0 disables the sweeper
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+# Sessions deleted per transaction
+SESSION_SWEEP_BATCH = int(os.getenv("SESSION_SWEEP_BATCH", "500"))
+
+
+class SessionSweeper(threading.Thread):
+    """ SessionSweeper class: deletes expired sessions every interval
+    seconds, one short transaction per batch
+    """
+
+    def __init__(self, db, interval: float = None, batch_size: int = None,
+                 pause: float = 0.01):
+        """ Initialize a new SessionSweeper instance """
+        super().__init__(name="session-sweeper", daemon=True)
+        self._db = db
+        self.interval = (SESSION_SWEEP_INTERVAL if interval is None
+                         else interval)
+        self.batch_size = (SESSION_SWEEP_BATCH if batch_size is None
+                           else batch_size)
+        # Seconds between two batches, for requests waiting on the lock
+        self.pause = pause
+        self._stopped = threading.Event()
+
+    def sweep(self) -> int:
+        """ This method deletes every expired session, batch by batch,
+        and returns the number deleted
+        """
+        deleted = 0
+        try:
+            while not self._stopped.is_set():
+                batch = self._db.delete_expired_sessions(self.batch_size,
+                                                         max_batches=1)
+                deleted += batch
+                if batch < self.batch_size:
+                    break
+                self._stopped.wait(self.pause)
+        finally:
+            self._db.remove_session()
+        return deleted
+
+    def run(self) -> None:
+        """ This method sweeps until stop is called """
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except SQLAlchemyError:
+                # Retried at the next sweep
+                logging.getLogger(__name__).exception("session sweep failed")
+
+    def stop(self) -> None:
+        """ This method ends the thread after the current batch """
+        self._stopped.set()
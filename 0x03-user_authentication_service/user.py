@@ -3,17 +3,45 @@
     that inherits from Base class from SQLAlchemy
     and defines the table called users and its columns
 """
-
-from sqlalchemy import Column, Integer, String
+import os
+from sqlalchemy import (Column, DateTime, ForeignKey, Index, Integer,
+                        String)
 from sqlalchemy.ext.declarative import declarative_base
 Base = declarative_base()
 
+# Seconds a session lives after log in
+SESSION_TTL = int(os.getenv("SESSION_TTL", "86400"))
+
 
 class User(Base):
     """ This class defines a table called users and its columns """
     __tablename__ = 'users'
+    # Every lookup column is unique; NULL session_id / reset_token repeat
+    __table_args__ = (
+        Index('ix_users_email', 'email', unique=True),
+        Index('ix_users_session_id', 'session_id', unique=True),
+        Index('ix_users_reset_token', 'reset_token', unique=True),
+    )
     id = Column(Integer, primary_key=True)
     email = Column(String(250), nullable=False)
     hashed_password = Column(String(250), nullable=False)
+    # Unused since sessions moved to their own table, kept for old clients
     session_id = Column(String(250))
     reset_token = Column(String(250))
+
+
+class UserSession(Base):
+    """ This class defines a table called sessions: one row per
+    logged in device of a user
+    """
+    __tablename__ = 'sessions'
+    # The session ID is the primary key; the sweeper scans expires_at
+    __table_args__ = (
+        Index('ix_sessions_user_id', 'user_id'),
+        Index('ix_sessions_expires_at', 'expires_at'),
+    )
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    device = Column(String(250))
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)